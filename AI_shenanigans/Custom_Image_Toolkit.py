@@ -1,7 +1,22 @@
 import os
 import io
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import statistics
+from itertools import islice, repeat
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image
 
+try:
+    import resource  # peak memory stats (not available on Windows)
+except ImportError:
+    resource = None
+
 # ==============================================================================
 #                               USER CONFIGURATION
 #              (Set value to None if you don't want to use it)
@@ -27,125 +42,831 @@ TARGET_HEIGHT = None
 # Example: 5.0 (for 5MB), 0.5 (for 500KB)
 MAX_SIZE_MB = 2.0
 
+# 5. PARALLEL WORKERS
+# Number of processes to run at once (one image per task).
+# Set to None to process files one after another in a single process.
+# Example: os.cpu_count() (use every core), 4
+WORKERS = os.cpu_count()
+
+# 6. SUBFOLDERS & RE-RUNS
+# RECURSIVE: also process images in subfolders (layout is kept in OUTPUT_FOLDER).
+# MANIFEST_FILE: remembers what was already processed (stored in OUTPUT_FOLDER),
+# so re-runs skip files that haven't changed. Set to None to always redo everything.
+RECURSIVE = True
+MANIFEST_FILE = ".toolkit_manifest.json"
+
+# 7. FAST RESIZE
+# Let the JPEG decoder shrink big photos while loading (draft mode), then
+# pre-reduce before the final LANCZOS pass. Much faster and lighter on memory
+# for big downscales, with almost identical results.
+# Set to None to always fully decode and resize with LANCZOS only.
+FAST_RESIZE = True
+
+# 8. JOB REPORT
+# Times every stage (decode, convert, resize, quantize, encode, write) for each
+# file and writes one JSON line per file plus a summary with per-stage totals
+# and percentiles to this file in OUTPUT_FOLDER. Set to None to turn it off.
+REPORT_FILE = "job_report.jsonl"
+
+# 9. SKIP DUPLICATES
+# Spot images that look the same (re-saved JPEGs, the same picture as PNG and
+# JPEG) with a perceptual hash, and hardlink/copy the output that already exists
+# instead of encoding it again. The hash index is kept in OUTPUT_FOLDER.
+# Example: ".toolkit_dedup.json"
+DEDUP_INDEX = None
+
+# 10. PNG SHRINKING
+# PNGs that are still over MAX_SIZE_MB with a 64 color palette get one last
+# try at a smaller width/height. Set to None to keep their dimensions.
+PNG_DOWNSCALE = True
+
 # ==============================================================================
 #                  END CONFIGURATION - SCRIPT LOGIC BELOW
 # ==============================================================================
 
 
+class ImageJob:
+    """The settings of a job (format, resize, size limit, fast resize, folders).
+
+    Defaults are the USER CONFIGURATION values above. Worker processes only
+    look at the job they're handed, never at the globals (on Windows and
+    macOS they start from a fresh import with the default values).
+    Other programs can import this file and convert images in memory, with
+    no folders involved:
+
+        job = ImageJob(target_format="JPEG", target_width=800, max_size_mb=0.5)
+        data = process_image(photo_bytes, job)
+    """
+
+    def __init__(
+        self,
+        target_format=TARGET_FORMAT,
+        target_width=TARGET_WIDTH,
+        target_height=TARGET_HEIGHT,
+        max_size_mb=MAX_SIZE_MB,
+        fast_resize=FAST_RESIZE,
+        png_downscale=PNG_DOWNSCALE,
+        input_folder=INPUT_FOLDER,
+        output_folder=OUTPUT_FOLDER,
+        recursive=RECURSIVE,
+    ):
+        self.target_format = target_format
+        self.target_width = target_width
+        self.target_height = target_height
+        self.max_size_mb = max_size_mb
+        self.fast_resize = fast_resize
+        self.png_downscale = png_downscale
+        self.input_folder = input_folder
+        self.output_folder = output_folder
+        self.recursive = recursive
+
+    def save_format(self, original_ext):
+        """Return (save format, new extension) for a file with this extension."""
+        # --- LOGIC 1: FORMAT ---
+        if self.target_format:
+            save_format = self.target_format.upper()
+            # Fix common naming mismatch
+            if save_format == "JPG":
+                save_format = "JPEG"
+            return save_format, f".{save_format.lower().replace('jpeg', 'jpg')}"
+
+        # Keep original format
+        save_format = "JPEG" if original_ext in [".jpg", ".jpeg"] else "PNG"
+        return save_format, original_ext
+
+    def target_size(self, width, height):
+        """New (width, height) for an image of the given size, or None to skip resizing."""
+        # --- LOGIC 2: RESIZE ---
+        # Case A: Width AND Height set -> Force exact dimensions
+        if self.target_width and self.target_height:
+            return self.target_width, self.target_height
+
+        # Case B: Width Only -> Calc Height
+        elif self.target_width and not self.target_height:
+            aspect = height / width
+            return self.target_width, int(self.target_width * aspect)
+
+        # Case C: Height Only -> Calc Width
+        elif self.target_height and not self.target_width:
+            aspect = width / height
+            return int(self.target_height * aspect), self.target_height
+
+        return None
+
+    def config_hash(self):
+        """Short hash of the settings that change the output of a file."""
+        settings = [
+            self.target_format,
+            self.target_width,
+            self.target_height,
+            self.max_size_mb,
+            self.png_downscale,
+        ]
+        return hashlib.sha1(repr(settings).encode()).hexdigest()[:12]
+
+
+def job_from_config():
+    """ImageJob built from the USER CONFIGURATION globals as they are right now."""
+    return ImageJob(
+        TARGET_FORMAT,
+        TARGET_WIDTH,
+        TARGET_HEIGHT,
+        MAX_SIZE_MB,
+        FAST_RESIZE,
+        PNG_DOWNSCALE,
+        INPUT_FOLDER,
+        OUTPUT_FOLDER,
+        RECURSIVE,
+    )
+
+
+def encode_to_size(img, save_format, target_bytes, report=None, downscale=False):
+    """Encode img so it fits in target_bytes, keeping as much quality as possible.
+
+    JPEG/WEBP: bisects over the same quality steps the old loop walked
+    (95, 90, ... 5), so it needs about log2(19) encodes instead of up to 19.
+    PNG: walks a ladder where every step is tried at most once: default zlib
+    level, optimize=True (only when that can close the gap), 256/128/64 color
+    palettes, then (with downscale) one smaller 64 color version.
+
+    Only two buffers are ever alive: the best encode so far and a scratch one
+    that failed attempts get rewritten into.
+
+    Returns (buffer, quality, attempts). quality is the JPEG/WEBP quality, or a
+    label like "128 colors" for the PNG step used. If nothing fits, the
+    smallest encode is returned anyway (same as the old loop).
+    Encode, quantize and resize times are added to report (see process_file).
+    """
+
+    def encode(buffer, image, **options):
+        if report is not None:
+            start = time.perf_counter()
+        buffer.seek(0)
+        buffer.truncate()
+        image.save(buffer, format=save_format, **options)
+        if report is not None:
+            add_time(report, "encode", start)
+        return buffer.tell()
+
+    buffer = io.BytesIO()
+
+    # PNGs use palettes to reduce size, JPEGs use 'quality'
+    if save_format == "PNG":
+        return encode_png_ladder(img, target_bytes, buffer, encode, report, downscale)
+
+    # Most files already fit at the top quality, so try that first
+    qualities = list(range(95, 0, -5))
+    attempts = 1
+    if encode(buffer, img, quality=qualities[0], optimize=True) <= target_bytes:
+        return buffer, qualities[0], attempts
+
+    # Bisect for the first (= highest) quality step that fits
+    best, best_quality = None, None
+    low, high = 1, len(qualities) - 1
+    while low <= high:
+        mid = (low + high) // 2
+        attempts += 1
+        if encode(buffer, img, quality=qualities[mid], optimize=True) <= target_bytes:
+            # Keep this one; the old best (if any) becomes the scratch buffer
+            best, buffer = buffer, best or io.BytesIO()
+            best_quality = qualities[mid]
+            high = mid - 1
+        else:
+            low = mid + 1
+
+    # Nothing fits: keep the lowest quality, like the old loop did
+    if best is None:
+        if mid != len(qualities) - 1:
+            encode(buffer, img, quality=qualities[-1], optimize=True)
+            attempts += 1
+        best, best_quality = buffer, qualities[-1]
+
+    return best, best_quality, attempts
+
+
+def encode_png_ladder(img, target_bytes, buffer, encode, report, downscale):
+    """PNG part of encode_to_size(); each step is tried at most once."""
+    # Default zlib level first: much faster than optimize=True
+    attempts = 1
+    size = encode(buffer, img, compress_level=6)
+    if size <= target_bytes:
+        return buffer, "compress level 6", attempts
+
+    # optimize=True only saves a few percent, so skip it when the gap is bigger
+    if size <= target_bytes * 1.15:
+        attempts += 1
+        if encode(buffer, img, optimize=True) <= target_bytes:
+            return buffer, "optimized", attempts
+
+    # Palettes need RGB/RGBA input for the fast quantizer
+    if img.mode not in ("RGB", "RGBA"):
+        has_alpha = img.mode in ("LA", "PA") or "transparency" in img.info
+        img = img.convert("RGBA" if has_alpha else "RGB")
+
+    def quantize(image, colors):
+        if report is not None:
+            start = time.perf_counter()
+        image = image.quantize(colors=colors, method=Image.Quantize.FASTOCTREE)
+        if report is not None:
+            add_time(report, "quantize", start)
+        return image
+
+    for colors in (256, 128, 64):
+        attempts += 1
+        if encode(buffer, quantize(img, colors), optimize=True) <= target_bytes:
+            return buffer, f"{colors} colors", attempts
+
+    if not downscale:
+        return buffer, "64 colors", attempts
+
+    # Last resort: shrink so the pixel count matches the byte budget (with a margin)
+    scale = min(0.95, (target_bytes / buffer.tell()) ** 0.5 * 0.95)
+    new_size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+    if report is not None:
+        start = time.perf_counter()
+    img = img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    if report is not None:
+        add_time(report, "resize", start)
+
+    attempts += 1
+    encode(buffer, quantize(img, 64), optimize=True)
+    return buffer, f"64 colors, {scale:.0%} size", attempts
+
+
+# Permissions a normally created file gets (save_atomic's temp files start out private)
+default_umask = os.umask(0)
+os.umask(default_umask)
+
+
+def save_atomic(output_path, write):
+    """Call write(file) on a temp file next to output_path, then rename it into place.
+
+    A crash or error mid-write never leaves a truncated output behind. Every
+    call gets its own temp file, so workers writing the same output (photo.jpg
+    and photo.png both becoming photo.png) can't write into each other's.
+    """
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(output_path), prefix=os.path.basename(output_path) + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.chmod(temp_path, 0o666 & ~default_umask)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_buffer(buffer):
+    """Writer for save_atomic that hands the file a view of buffer (no copy)."""
+
+    def write(f):
+        with buffer.getbuffer() as view:
+            f.write(view)
+
+    return write
+
+
+def output_target(filename, job):
+    """Work out the save format and output path for a file (relative to the input folder)."""
+    name, original_ext = os.path.splitext(filename)
+    save_format, new_ext = job.save_format(original_ext.lower())
+    return save_format, os.path.join(job.output_folder, f"{name}{new_ext}")
+
+
+def peak_memory_mb():
+    """Peak RSS of this process so far in MB, or None if the OS can't tell us."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def add_time(report, stage, start):
+    """Add the time since start to a stage in report; returns the current time."""
+    now = time.perf_counter()
+    report["stages"][stage] = report["stages"].get(stage, 0) + now - start
+    return now
+
+
+def encode_image(img, save_format, job, report=None):
+    """Resize, convert and encode an opened (not yet loaded) image for job.
+
+    Returns (buffer, quality, attempts) like encode_to_size(). Stage times are
+    added to report when one is given.
+    """
+    if report is not None:
+        start = time.perf_counter()
+
+    new_size = job.target_size(img.width, img.height)
+
+    # Ask the JPEG decoder for a smaller image (1/2, 1/4 or 1/8 scale,
+    # never below new_size). Does nothing for other formats.
+    if new_size and job.fast_resize:
+        img.draft(None, new_size)
+
+    if report is not None:
+        img.load()  # decode now, so it isn't counted as convert/resize
+        start = add_time(report, "decode", start)
+
+    # Ensure RGB mode if saving as JPEG (removes transparency to avoid errors)
+    if save_format == "JPEG" and img.mode in ("RGBA", "P"):
+        img = img.convert("RGB")
+
+    if report is not None:
+        start = add_time(report, "convert", start)
+
+    if new_size and job.fast_resize:
+        # Cheap box reduction first, LANCZOS only for the last 3x
+        img = img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    elif new_size:
+        img = img.resize(new_size, Image.Resampling.LANCZOS)
+
+    if report is not None:
+        add_time(report, "resize", start)
+
+    # --- LOGIC 3: SAVE & COMPRESS ---
+    # If a size limit is set, search for the best quality that fits
+    if job.max_size_mb:
+        target_bytes = job.max_size_mb * 1024 * 1024
+        return encode_to_size(
+            img, save_format, target_bytes, report, job.png_downscale
+        )
+
+    # If NO size limit, just save normally
+    if report is not None:
+        start = time.perf_counter()
+    buffer = io.BytesIO()
+    img.save(buffer, format=save_format, quality=95)
+    if report is not None:
+        add_time(report, "encode", start)
+    return buffer, None, 1
+
+
+def process_image(source, job):
+    """Convert one image with the settings in job and return the encoded bytes.
+
+    source can be the image bytes, a file path or an open file. With
+    target_format None, JPEGs stay JPEG and everything else becomes PNG.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    with Image.open(source) as img:
+        save_format = job.save_format(f".{(img.format or 'png').lower()}")[0]
+        buffer, _, _ = encode_image(img, save_format, job)
+    return buffer.getvalue()
+
+
+def process_file(filename, job, timed=False):
+    """Process one image (path relative to job.input_folder) into job.output_folder.
+
+    Returns (ok, line, report). line is what gets printed for this file.
+    With timed, report is a dict with per-stage times and results for the
+    job report; otherwise it is None and no timing is done at all.
+    """
+    if not timed:
+        return (*convert_file(filename, job, None), None)
+
+    report = {"file": filename, "stages": {}}
+    start = time.perf_counter()
+    ok, line = convert_file(filename, job, report)
+    report["ok"] = ok
+    report["seconds"] = round(time.perf_counter() - start, 4)
+    report["stages"] = {k: round(v, 4) for k, v in report["stages"].items()}
+    report["peak_rss_mb"] = peak_memory_mb()
+    if not ok:
+        report["error"] = line
+    return ok, line, report
+
+
+def convert_file(filename, job, report):
+    filepath = os.path.join(job.input_folder, filename)
+
+    try:
+        with Image.open(filepath) as img:
+            save_format, output_path = output_target(filename, job)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+            buffer, quality, attempts = encode_image(img, save_format, job, report)
+            size = buffer.tell()
+
+            if report is not None:
+                start = time.perf_counter()
+            save_atomic(output_path, write_buffer(buffer))
+            if report is not None:
+                add_time(report, "write", start)
+                report.update(bytes_out=size, quality=quality, encodes=attempts)
+
+        if not job.max_size_mb:
+            return True, f"Processed {filename}"
+        if isinstance(quality, int):
+            quality = f"quality {quality}"
+        return True, f"Processed {filename} -> {size/1024/1024:.2f} MB ({quality}, {attempts} encodes)"
+
+    except Exception as e:
+        return False, f"Error on {filename}: {e}"
+
+
+def iter_images(job, relative=""):
+    """Yield (relative path, size, mtime) for every image in job.input_folder.
+
+    Uses os.scandir so files are handed out as they are found, without
+    building the whole list first. The output folder is skipped when it sits
+    inside the input folder (the default setup).
+    """
+    with os.scandir(os.path.join(job.input_folder, relative)) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if job.recursive and os.path.abspath(entry.path) != os.path.abspath(
+                    job.output_folder
+                ):
+                    yield from iter_images(job, os.path.join(relative, entry.name))
+            elif entry.name.lower().endswith((".jpg", ".jpeg", ".png", ".webp")):
+                stat = entry.stat()
+                yield os.path.join(relative, entry.name), stat.st_size, stat.st_mtime_ns
+
+
+def image_key(filename, job):
+    """Perceptual hash of an image: "<width>x<height>:<colours>:<dHash>".
+
+    The 64 bit dHash comes from a tiny grayscale thumbnail, so the same
+    picture gives the same (or almost the same) hash after re-saving or
+    converting to another format. It only sees the shapes, so colours is
+    a 2x2 RGBA thumbnail on top, which tells apart pictures that differ in
+    colour, brightness or transparency. Returns None if the file can't be
+    read (process_file will report the error).
+    """
+    try:
+        with Image.open(os.path.join(job.input_folder, filename)) as img:
+            width, height = img.size
+            img.draft("RGB", (72, 64))  # JPEG: decode at 1/8 scale or so
+            rgba = img.convert("RGBA")
+        small = rgba.convert("L").resize((9, 8), Image.Resampling.BOX)
+        colours = rgba.resize((2, 2), Image.Resampling.BOX).tobytes()
+    except Exception:
+        return None
+
+    # One bit per pixel: is it brighter than its right-hand neighbour?
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            i = row * 9 + col
+            bits = (bits << 1) | (pixels[i] > pixels[i + 1])
+    return f"{width}x{height}:{colours.hex()}:{bits:016x}"
+
+
+def split_key(key):
+    """(part that must match exactly, colour thumbnail bytes, dHash) of a dedup key."""
+    prefix, colours, bits = key.rsplit(":", 2)
+    return prefix, bytes.fromhex(colours), int(bits, 16)
+
+
+def hash_bands(key):
+    """Split a dedup key into 4 lookup slots, one per 16 bit slice of the hash.
+
+    Two hashes that differ in 3 bits or fewer always share at least one slot,
+    so near matches can be found without comparing against every key.
+    """
+    prefix, _, bits = split_key(key)
+    return [(prefix, band, (bits >> (16 * band)) & 0xFFFF) for band in range(4)]
+
+
+def find_similar(key, bands):
+    """Return a key from bands within 3 bits and 16 colour levels of key, or None."""
+    _, colours, bits = split_key(key)
+    for slot in hash_bands(key):
+        for other in bands.get(slot, ()):
+            _, other_colours, other_bits = split_key(other)
+            if (bits ^ other_bits).bit_count() <= 3 and all(
+                abs(a - b) <= 16 for a, b in zip(colours, other_colours)
+            ):
+                return other
+    return None
+
+
+def add_to_bands(key, bands):
+    for slot in hash_bands(key):
+        bands.setdefault(slot, []).append(key)
+
+
+def remove_from_bands(key, bands):
+    for slot in hash_bands(key):
+        if key in bands.get(slot, ()):
+            bands[slot].remove(key)
+
+
+def link_output(filename, existing, job):
+    """Point filename's output at an existing output (relative to job.output_folder)."""
+    source = os.path.join(job.output_folder, existing)
+    output_path = output_target(filename, job)[1]
+
+    # Same output name (e.g. photo.jpg and photo.png -> photo.png): nothing to do
+    if os.path.abspath(source) != os.path.abspath(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        try:
+            os.link(source, output_path)
+        except OSError:  # other drive, or the filesystem has no hardlinks
+            shutil.copyfile(source, output_path)
+    return True, f"Duplicate {filename} -> same as {existing}"
+
+
+def load_state(folder, name):
+    """Load a JSON state file (manifest, dedup index) from folder, or {}."""
+    if not name:
+        return {}
+    try:
+        with open(os.path.join(folder, name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(folder, name, data):
+    if not name:
+        return
+    path = os.path.join(folder, name)
+    # Write to a temp file first so a crash never leaves a half-written file
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+def percentile(values, pct):
+    """pct-th percentile (nearest rank) of a sorted list."""
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def stage_summary(reports):
+    """Per-stage totals and percentiles (seconds) over all file reports."""
+    stages = {}
+    for report in reports:
+        for stage, seconds in report["stages"].items():
+            stages.setdefault(stage, []).append(seconds)
+        stages.setdefault("total", []).append(report["seconds"])
+
+    summary = {}
+    for stage, values in stages.items():
+        values.sort()
+        summary[stage] = {
+            "files": len(values),
+            "total": round(sum(values), 4),
+            "mean": round(statistics.fmean(values), 4),
+            "p50": round(percentile(values, 50), 4),
+            "p90": round(percentile(values, 90), 4),
+            "p99": round(percentile(values, 99), 4),
+            "max": round(values[-1], 4),
+        }
+    return summary
+
+
+def print_summary(summary):
+    print("\n--- STAGE TIMES (seconds) ---")
+    print(f"{'Stage':10} {'Files':>7} {'Total':>10} {'p50':>8} {'p90':>8} {'p99':>8} {'Max':>8}")
+    for stage, row in summary.items():
+        print(
+            f"{stage:10} {row['files']:7} {row['total']:10.2f} {row['p50']:8.3f}"
+            f" {row['p90']:8.3f} {row['p99']:8.3f} {row['max']:8.3f}"
+        )
+
+
 def process_images():
+    job = job_from_config()
+
     # Create output folder if it doesn't exist
-    if not os.path.exists(OUTPUT_FOLDER):
-        os.makedirs(OUTPUT_FOLDER)
+    if not os.path.exists(job.output_folder):
+        os.makedirs(job.output_folder)
 
     print(f"--- STARTING JOB ---")
     print(f"Format: {TARGET_FORMAT if TARGET_FORMAT else 'Original'}")
     print(
         f"Resize: W={TARGET_WIDTH if TARGET_WIDTH else 'Auto'} / H={TARGET_HEIGHT if TARGET_HEIGHT else 'Auto'}"
     )
-    print(f"Max Size: {MAX_SIZE_MB if MAX_SIZE_MB else 'Unlimited'} MB\n")
+    print(f"Max Size: {MAX_SIZE_MB if MAX_SIZE_MB else 'Unlimited'} MB")
+    print(f"Fast Resize: {'On' if FAST_RESIZE else 'Off'}")
+    print(f"Workers: {WORKERS if WORKERS else 1}\n")
 
-    files = [
-        f
-        for f in os.listdir(INPUT_FOLDER)
-        if f.lower().endswith((".jpg", ".jpeg", ".png", ".webp"))
-    ]
+    timed = bool(REPORT_FILE)
 
-    if not files:
-        print("No images found in input folder.")
-        return
+    # Manifest maps relative path -> [size, mtime, config hash] of the last good run
+    manifest = load_state(job.output_folder, MANIFEST_FILE)
+    # Dedup index maps "config:format:image key" -> output path of the first copy
+    # (keys from before the colour thumbnail was added have one ":" less and are dropped)
+    dedup_index = {
+        key: path for key, path in load_state(job.output_folder, DEDUP_INDEX).items() if key.count(":") == 4
+    }
+    bands = {}  # near-match lookup over dedup_index and claimed keys
+    outputs = {}  # output path -> dedup_index keys pointing at it
+    for key, path in dedup_index.items():
+        add_to_bands(key, bands)
+        outputs.setdefault(path, set()).add(key)
+    current_config = job.config_hash()
+    found = 0
+    skipped = 0
+    duplicates = 0
+    claimed = set()  # dedup keys being encoded right now
+    waiting = []  # duplicates of a file that is still being encoded
+    reports = []  # per-file stage times for the end-of-job summary
+    report_file = (
+        open(os.path.join(job.output_folder, REPORT_FILE), "w") if REPORT_FILE else None
+    )
 
-    for filename in files:
-        filepath = os.path.join(INPUT_FOLDER, filename)
+    def files_to_do():
+        # Skip files whose output is already up to date
+        nonlocal found, skipped
+        for filename, size, mtime in iter_images(job):
+            found += 1
+            if manifest.get(filename) == [size, mtime, current_config] and (
+                os.path.exists(output_target(filename, job)[1])
+            ):
+                skipped += 1
+                continue
+            yield filename, [size, mtime, current_config], None
 
-        try:
-            with Image.open(filepath) as img:
-                # --- LOGIC 1: FORMAT ---
-                # Determine output extension and format
-                original_ext = os.path.splitext(filename)[1].lower()
-
-                if TARGET_FORMAT:
-                    save_format = TARGET_FORMAT.upper()
-                    # Fix common naming mismatch
-                    if save_format == "JPG":
-                        save_format = "JPEG"
-                    new_ext = f".{save_format.lower().replace('jpeg', 'jpg')}"
+    def output_of(filename):
+        return os.path.relpath(output_target(filename, job)[1], job.output_folder)
+
+    def forget_output(filename):
+        # filename's output is about to be rewritten, so keys pointing at the
+        # picture in it now would link later duplicates to the wrong image
+        for old in outputs.pop(output_of(filename), ()):
+            dedup_index.pop(old, None)
+            remove_from_bands(old, bands)
+
+    def skip_duplicates(todo, hash_many):
+        # Hash files a batch at a time; only the first file with a key gets encoded
+        while True:
+            batch = list(islice(todo, 64))
+            if not batch:
+                return
+            keys = hash_many([filename for filename, _, _ in batch])
+            for (filename, entry, _), key in zip(batch, keys):
+                if key is None:
+                    forget_output(filename)
+                    yield filename, entry, None
+                    continue
+                key = f"{current_config}:{output_target(filename, job)[0]}:{key}"
+                match = find_similar(key, bands)
+                existing = dedup_index.get(match)
+                if existing and os.path.exists(os.path.join(job.output_folder, existing)):
+                    if existing != output_of(filename):
+                        forget_output(filename)
+                    record((filename, entry, None), *link_output(filename, existing, job))
+                elif match in claimed:
+                    waiting.append((filename, entry, match))
                 else:
-                    # Keep original format
-                    save_format = "JPEG" if original_ext in [".jpg", ".jpeg"] else "PNG"
-                    new_ext = original_ext
-
-                output_filename = f"{os.path.splitext(filename)[0]}{new_ext}"
-                output_path = os.path.join(OUTPUT_FOLDER, output_filename)
-
-                # Ensure RGB mode if saving as JPEG (removes transparency to avoid errors)
-                if save_format == "JPEG" and img.mode in ("RGBA", "P"):
-                    img = img.convert("RGB")
-
-                # --- LOGIC 2: RESIZE ---
-                # Case A: Width AND Height set -> Force exact dimensions
-                if TARGET_WIDTH and TARGET_HEIGHT:
-                    img = img.resize(
-                        (TARGET_WIDTH, TARGET_HEIGHT), Image.Resampling.LANCZOS
-                    )
-
-                # Case B: Width Only -> Calc Height
-                elif TARGET_WIDTH and not TARGET_HEIGHT:
-                    aspect = img.height / img.width
-                    new_height = int(TARGET_WIDTH * aspect)
-                    img = img.resize(
-                        (TARGET_WIDTH, new_height), Image.Resampling.LANCZOS
-                    )
-
-                # Case C: Height Only -> Calc Width
-                elif TARGET_HEIGHT and not TARGET_WIDTH:
-                    aspect = img.width / img.height
-                    new_width = int(TARGET_HEIGHT * aspect)
-                    img = img.resize(
-                        (new_width, TARGET_HEIGHT), Image.Resampling.LANCZOS
-                    )
-
-                # --- LOGIC 3: SAVE & COMPRESS ---
-                # If a size limit is set, run the compression loop
-                if MAX_SIZE_MB:
-                    target_bytes = MAX_SIZE_MB * 1024 * 1024
-                    quality = 95
-
-                    while True:
-                        buffer = io.BytesIO()
-
-                        # PNGs use 'quantize' to reduce size, JPEGs use 'quality'
-                        if save_format == "PNG":
-                            if (
-                                quality < 80
-                            ):  # Start reducing colors if simple optimization fails
-                                img = img.quantize(colors=256)
-                            img.save(buffer, format=save_format, optimize=True)
-                        else:
-                            img.save(
-                                buffer,
-                                format=save_format,
-                                quality=quality,
-                                optimize=True,
-                            )
-
-                        size = buffer.tell()
-
-                        if size <= target_bytes or quality < 10:
-                            with open(output_path, "wb") as f:
-                                f.write(buffer.getvalue())
-                            print(f"Processed {filename} -> {size/1024/1024:.2f} MB")
+                    forget_output(filename)
+                    claimed.add(key)
+                    add_to_bands(key, bands)
+                    yield filename, entry, key
+
+    def record(task, ok, line, report=None):
+        nonlocal duplicates
+        filename, entry, key = task
+        print(line)
+        if report_file:
+            if report is None:  # duplicates and crashed workers
+                report = {"file": filename, "ok": ok, "message": line}
+            else:
+                reports.append(report)
+            report_file.write(json.dumps(report) + "\n")
+        if ok:
+            manifest[filename] = entry
+            if line.startswith("Duplicate"):
+                duplicates += 1
+            elif key:
+                dedup_index[key] = output_of(filename)
+                outputs.setdefault(dedup_index[key], set()).add(key)
+        else:
+            manifest.pop(filename, None)
+
+    try:
+        # One process: handle files one after another
+        if not WORKERS or WORKERS <= 1:
+            todo = files_to_do()
+            if DEDUP_INDEX:
+                todo = skip_duplicates(todo, lambda files: map(image_key, files, repeat(job)))
+            for task in todo:
+                record(task, *process_file(task[0], job, timed))
+
+        # Worker pool: one image per task, print each line as soon as it finishes.
+        # Only a few tasks per worker are queued at a time, so huge folders start
+        # right away and don't pile up in memory.
+        # process_file catches its own errors, but a worker that dies outright
+        # (e.g. a decoder crash) breaks the whole pool. Then a new pool is started,
+        # the files that were in flight are re-run one at a time to find the one
+        # that crashed, and only that file is reported as an error.
+        else:
+            pool = ProcessPoolExecutor(max_workers=WORKERS)
+
+            def restart_pool():
+                nonlocal pool
+                pool.shutdown(wait=False)
+                pool = ProcessPoolExecutor(max_workers=WORKERS)
+
+            def submit(task):
+                try:
+                    return pool.submit(process_file, task[0], job, timed)
+                except BrokenProcessPool as e:  # broke since the last wait()
+                    future = Future()
+                    future.set_exception(e)
+                    return future
+
+            def hash_in_pool(files):
+                try:
+                    return list(pool.map(image_key, files, repeat(job), chunksize=4))
+                except BrokenProcessPool:
+                    # These files are encoded without dedup; if one of them
+                    # crashes the worker again, that's caught below
+                    restart_pool()
+                    return [None] * len(files)
+
+            def rerun_one_at_a_time(tasks):
+                for task in tasks:
+                    try:
+                        record(task, *submit(task).result())
+                    except BrokenProcessPool:
+                        record(task, False, f"Error on {task[0]}: the worker crashed on this file")
+                        restart_pool()
+                    except Exception as e:
+                        record(task, False, f"Error on {task[0]}: {e}")
+
+            try:
+                pending = {}
+                todo = files_to_do()
+                if DEDUP_INDEX:
+                    todo = skip_duplicates(todo, hash_in_pool)
+                while True:
+                    for task in todo:
+                        pending[submit(task)] = task
+                        if len(pending) >= WORKERS * 4:
                             break
+                    if not pending:
+                        break
 
-                        # Reduce quality for next attempt
-                        quality -= 5
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    crashed = []
+                    for future in done:
+                        task = pending.pop(future)
+                        try:
+                            record(task, *future.result())
+                        except BrokenProcessPool:
+                            crashed.append(task)
+                        except Exception as e:
+                            record(task, False, f"Error on {task[0]}: {e}")
 
-                # If NO size limit, just save normally
-                else:
-                    img.save(output_path, format=save_format, quality=95)
-                    print(f"Processed {filename}")
+                    if crashed:
+                        # The rest of the in-flight tasks fail with the pool too
+                        # (the ones that finished just before it broke keep their result)
+                        for future, task in pending.items():
+                            try:
+                                record(task, *future.result())
+                            except BrokenProcessPool:
+                                crashed.append(task)
+                            except Exception as e:
+                                record(task, False, f"Error on {task[0]}: {e}")
+                        pending.clear()
+                        restart_pool()
+                        rerun_one_at_a_time(crashed)
+            finally:
+                pool.shutdown()
+
+        # Duplicates of files that were still being encoded when they came up.
+        # If the first copy failed, encode them after all.
+        for filename, entry, key in waiting:
+            if dedup_index.get(key) != output_of(filename):
+                forget_output(filename)
+            if key in dedup_index:
+                record(
+                    (filename, entry, None),
+                    *link_output(filename, dedup_index[key], job),
+                )
+            else:
+                record((filename, entry, key), *process_file(filename, job, timed))
+    finally:
+        save_state(job.output_folder, MANIFEST_FILE, manifest)
+        save_state(job.output_folder, DEDUP_INDEX, dedup_index)
+        if report_file:
+            summary = stage_summary(reports)
+            report_file.write(json.dumps({"summary": summary}) + "\n")
+            report_file.close()
 
-        except Exception as e:
-            print(f"Error on {filename}: {e}")
+    if not found:
+        print("No images found in input folder.")
+        return
+    if skipped:
+        print(f"\nSkipped {skipped} unchanged files.")
+    if duplicates:
+        print(f"\nSaved {duplicates} encodes by reusing duplicate outputs.")
+    if reports:
+        print_summary(summary)
+        print(f"\nReport saved to: {os.path.join(job.output_folder, REPORT_FILE)}")
 
     print("\nAll Done!")
 
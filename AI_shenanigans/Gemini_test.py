@@ -1,28 +1,59 @@
 import base64
 import os
+import json
+import time
+import asyncio
+import hashlib
 from google import genai
-from google.genai import types
+from google.genai import types, errors
 
+# --- BATCH SETTINGS ---
+RUN_BATCH = False  # True: run every prompt in PROMPTS_FILE instead of the single prompt below
+PROMPTS_FILE = "prompts.jsonl"  # One {"id": ..., "prompt": "..."} per line
+RESULTS_FILE = "results.jsonl"  # One result per line, written as each prompt finishes
+MAX_CONCURRENT = 8  # Requests running at the same time
+REQUESTS_PER_MINUTE = 60  # Stay under the API quota
+RETRIES = 3  # Extra tries for rate limit / overload errors (429, 503)
 
-def generate():
-    client = genai.Client(
+# --- RESPONSE CACHE ---
+# Same model + prompt + config = answer comes from disk instead of the API.
+CACHE_DIR = ".gemini_cache"  # None = always call the API
+CACHE_TTL_HOURS = 24  # Older answers are asked again (search results change)
+CACHE_MAX_MB = 200  # Least recently used answers are deleted past this size
+
+# --- LATENCY STATS ---
+# Time to first chunk buckets (seconds) for the histogram printed after a batch
+TTFT_BUCKETS = [0.25, 0.5, 1, 2, 5, 10, 30]
+
+MODEL = "gemini-3-flash-preview"
+
+
+def make_client():
+    # GEMINI_BASE_URL points the client somewhere else (e.g. a local mock server)
+    base_url = os.environ.get("GEMINI_BASE_URL")
+    return genai.Client(
         api_key=os.environ.get("GOOGLE_API_KEY"),
+        http_options=types.HttpOptions(base_url=base_url) if base_url else None,
     )
 
-    model = "gemini-3-flash-preview"
-    contents = [
+
+def make_contents(prompt):
+    return [
         types.Content(
             role="user",
             parts=[
-                types.Part.from_text(text="""INSERT_INPUT_HERE"""),
+                types.Part.from_text(text=prompt),
             ],
         ),
     ]
+
+
+def make_config():
     tools = [
         types.Tool(googleSearch=types.GoogleSearch(
         )),
     ]
-    generate_content_config = types.GenerateContentConfig(
+    return types.GenerateContentConfig(
         thinking_config=types.ThinkingConfig(
             thinking_level="HIGH",
         ),
@@ -30,12 +61,325 @@ def generate():
         response_mime_type="text/plain",
     )
 
+
+def cache_key(model, contents, config):
+    """Hash of everything that decides the answer: model, contents, tools and config."""
+    request = {
+        "model": model,
+        "contents": [c.model_dump(mode="json", exclude_none=True) for c in contents],
+        "config": config.model_dump(mode="json", exclude_none=True),
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+
+def cache_load(key):
+    """Cached chunks for key, or None if missing or older than CACHE_TTL_HOURS."""
+    if not CACHE_DIR:
+        return None
+    path = os.path.join(CACHE_DIR, key + ".json")
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if time.time() - entry["created"] > CACHE_TTL_HOURS * 3600:
+        os.remove(path)
+        return None
+
+    os.utime(path)  # mark as recently used for the LRU clean-up
+    return [types.GenerateContentResponse.model_validate(c) for c in entry["chunks"]]
+
+
+# Bytes in CACHE_DIR: counted on the first save, then kept up to date by
+# cache_save, so the folder is only scanned again when it needs trimming
+cache_bytes = None
+
+
+def cache_save(key, chunks):
+    """Store the streamed chunks (boundaries kept) and trim the cache to CACHE_MAX_MB."""
+    global cache_bytes
+    if not CACHE_DIR:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    entry = {
+        "created": time.time(),
+        "chunks": [
+            c.model_dump(mode="json", exclude_none=True, exclude={"sdk_http_response"})
+            for c in chunks
+        ],
+    }
+    path = os.path.join(CACHE_DIR, key + ".json")
+    old_size = os.path.getsize(path) if os.path.exists(path) else 0
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(path + ".tmp", path)
+
+    if cache_bytes is None:
+        cache_bytes = sum(e.stat().st_size for e in os.scandir(CACHE_DIR) if e.name.endswith(".json"))
+    else:
+        cache_bytes += os.path.getsize(path) - old_size
+    if cache_bytes > CACHE_MAX_MB * 1024 * 1024:
+        cache_bytes = trim_cache()
+
+
+def trim_cache():
+    """Delete least recently used answers until the cache is at 90% of CACHE_MAX_MB.
+
+    Going a bit under the limit means the next few saves don't trim again.
+    Returns the size left.
+    """
+    files = [e for e in os.scandir(CACHE_DIR) if e.name.endswith(".json")]
+    total = sum(e.stat().st_size for e in files)
+    for entry in sorted(files, key=lambda e: e.stat().st_mtime):
+        if total <= CACHE_MAX_MB * 1024 * 1024 * 0.9:
+            break
+        total -= entry.stat().st_size
+        os.remove(entry.path)
+    return total
+
+
+def cached_stream(client, model, contents, config, timer=None):
+    """Like client.models.generate_content_stream, but answers from the cache when it can.
+
+    A cached answer is replayed chunk by chunk exactly as it was streamed.
+    """
+    key = cache_key(model, contents, config)
+    chunks = cache_load(key)
+    if chunks is not None:
+        if timer:
+            timer.cached = True
+        yield from chunks
+        return
+
+    chunks = []
     for chunk in client.models.generate_content_stream(
-        model=model,
-        contents=contents,
-        config=generate_content_config,
+        model=model, contents=contents, config=config
     ):
+        chunks.append(chunk)
+        yield chunk
+    cache_save(key, chunks)  # only complete answers get cached
+
+
+class StreamTimer:
+    """Timestamps every chunk of one streamed answer.
+
+    Call tick(chunk) for each chunk; it only appends a perf_counter() value
+    and keeps a reference to the chunk. Everything else is worked out in stats().
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.times = []
+        self.last = None
+        self.cached = False
+
+    def tick(self, chunk):
+        self.times.append(time.perf_counter())
+        self.last = chunk
+
+    def stats(self):
+        """Latency numbers for this answer (seconds, tokens/sec)."""
+        times = self.times
+        total = (times[-1] if times else time.perf_counter()) - self.start
+        gaps = [b - a for a, b in zip(times, times[1:])]
+
+        # The token counts come with the last chunk
+        usage = self.last.usage_metadata if self.last else None
+        tokens = (usage.candidates_token_count or 0) if usage else None
+        thoughts = (usage.thoughts_token_count or 0) if usage else None
+        # Tokens/sec is measured after the first chunk, so it doesn't include the wait for it
+        streaming = times[-1] - times[0] if len(times) > 1 else 0
+
+        return {
+            "ttft": round(times[0] - self.start, 4) if times else None,
+            "total": round(total, 4),
+            "chunks": len(times),
+            "max_gap": round(max(gaps), 4) if gaps else None,
+            "mean_gap": round(sum(gaps) / len(gaps), 4) if gaps else None,
+            "output_tokens": tokens,
+            "thought_tokens": thoughts,
+            "tokens_per_sec": round(tokens / streaming, 1) if tokens and streaming else None,
+            "cached": self.cached,
+        }
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None if empty)."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def latency_summary(all_stats):
+    """p50/p90/p99 of each stat plus a time to first chunk histogram.
+
+    Answers that came from the cache are left out, they'd only drag the numbers down.
+    """
+    live = [s for s in all_stats if not s["cached"]]
+    summary = {"requests": len(live), "cached": len(all_stats) - len(live)}
+    for name in ("ttft", "total", "max_gap", "tokens_per_sec"):
+        values = [s[name] for s in live if s[name] is not None]
+        summary[name] = {
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "p99": percentile(values, 99),
+        }
+
+    counts = [0] * (len(TTFT_BUCKETS) + 1)
+    for s in live:
+        if s["ttft"] is not None:
+            counts[sum(s["ttft"] > edge for edge in TTFT_BUCKETS)] += 1
+    summary["ttft_histogram"] = counts
+    return summary
+
+
+def print_latency_summary(summary):
+    print(f"\n--- LATENCY ({summary['requests']} requests, {summary['cached']} from cache) ---")
+    if not summary["requests"]:
+        return
+    for name in ("ttft", "total", "max_gap", "tokens_per_sec"):
+        p = summary[name]
+        print(f"{name:15} p50 {p['p50']}  p90 {p['p90']}  p99 {p['p99']}")
+
+    print("Time to first chunk:")
+    counts = summary["ttft_histogram"]
+    labels = [f"<= {edge}s" for edge in TTFT_BUCKETS] + [f"> {TTFT_BUCKETS[-1]}s"]
+    widest = max(counts) or 1
+    for label, count in zip(labels, counts):
+        print(f"  {label:>8} | {'#' * round(40 * count / widest):40} {count}")
+
+
+def generate():
+    client = make_client()
+
+    timer = StreamTimer()
+    for chunk in cached_stream(
+        client,
+        MODEL,
+        make_contents("""INSERT_INPUT_HERE"""),
+        make_config(),
+        timer,
+    ):
+        timer.tick(chunk)
         print(chunk.text, end="")
 
+    stats = timer.stats()
+    print(
+        f"\n\n[first chunk {stats['ttft']}s, total {stats['total']}s, "
+        f"{stats['chunks']} chunks, {stats['tokens_per_sec']} tokens/s]"
+    )
+
+
+class RateLimiter:
+    """Spaces requests out evenly so there are at most per_minute of them a minute."""
+
+    def __init__(self, per_minute):
+        self.interval = 60 / per_minute
+        self.next_slot = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def result_line(item, chunks, timer):
+    stats = timer.stats()
+    return {
+        "id": item.get("id"),
+        "text": "".join(chunk.text for chunk in chunks if chunk.text),
+        "seconds": round(stats["total"], 3),
+        "stats": stats,
+    }
+
+
+async def run_prompt(client, item, config, semaphore, limiter):
+    """Send one prompt (streamed) and return its result line.
+
+    The cache is checked first: a cached answer comes back right away,
+    without waiting for a free slot or the rate limiter.
+    """
+    contents = make_contents(item["prompt"])
+    key = cache_key(MODEL, contents, config)
+    chunks = cache_load(key)
+    if chunks is not None:
+        timer = StreamTimer()
+        timer.cached = True
+        for chunk in chunks:
+            timer.tick(chunk)
+        return result_line(item, chunks, timer)
+
+    async with semaphore:
+        for attempt in range(RETRIES + 1):
+            await limiter.wait()
+            timer = StreamTimer()
+            try:
+                chunks = []
+                async for chunk in await client.aio.models.generate_content_stream(
+                    model=MODEL, contents=contents, config=config
+                ):
+                    timer.tick(chunk)
+                    chunks.append(chunk)
+                cache_save(key, chunks)  # only complete answers get cached
+                return result_line(item, chunks, timer)
+            except errors.APIError as e:
+                # Rate limited or overloaded: back off and try again
+                if e.code in (429, 503) and attempt < RETRIES:
+                    await asyncio.sleep(2 ** attempt)
+                    continue
+                return {"id": item.get("id"), "error": str(e)}
+            except Exception as e:
+                return {"id": item.get("id"), "error": str(e)}
+
+
+async def run_batch(prompts_file=PROMPTS_FILE, results_file=RESULTS_FILE):
+    """Run every prompt in prompts_file through one shared client.
+
+    At most MAX_CONCURRENT requests run at once and no more than
+    REQUESTS_PER_MINUTE are started per minute. Results are written to
+    results_file as soon as each one finishes (so not in input order; use "id").
+    """
+    with open(prompts_file, encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    for i, item in enumerate(items):
+        item.setdefault("id", i)
+
+    client = make_client()
+    config = make_config()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+    limiter = RateLimiter(REQUESTS_PER_MINUTE)
+
+    start = time.perf_counter()
+    failed = 0
+    all_stats = []
+    tasks = [
+        asyncio.create_task(run_prompt(client, item, config, semaphore, limiter))
+        for item in items
+    ]
+    with open(results_file, "w", encoding="utf-8") as out:
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            result = await task
+            failed += "error" in result
+            if "stats" in result:
+                all_stats.append(result["stats"])
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            print(f"[{done}/{len(items)}] {result['id']}: {'error' if 'error' in result else 'ok'}")
+
+    print(f"Done: {len(items) - failed} ok, {failed} failed in {time.perf_counter() - start:.1f}s")
+    print(f"Results saved to: {results_file}")
+    if all_stats:
+        print_latency_summary(latency_summary(all_stats))
+
+
 if __name__ == "__main__":
-    generate()
\ No newline at end of file
+    if RUN_BATCH:
+        asyncio.run(run_batch())
+    else:
+        generate()
@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import itertools
+import multiprocessing
+import PIL
+from PIL import Image, ImageDraw
+
+import Custom_Image_Toolkit as toolkit
+
+# ==============================================================================
+#                               USER CONFIGURATION
+# ==============================================================================
+
+# 1. FOLDERS & FILES
+CORPUS_FOLDER = "./benchmark_corpus"  # Synthetic test images (re-used if they exist)
+OUTPUT_FOLDER = "./benchmark_output"  # Scratch folder for the toolkit's output
+RESULTS_FILE = "./benchmark_results.json"  # Where the numbers end up
+
+# 2. CORPUS
+# Same seed + same count = exactly the same images, so runs can be compared.
+CORPUS_SIZE = 40
+SEED = 1234
+
+# 3. CONFIGURATIONS TO RUN
+# Every combination below is run against the whole corpus.
+FORMATS = ["PNG", "JPEG", None]
+RESIZES = {
+    "A (width+height)": (1200, 800),
+    "B (width only)": (1200, None),
+    "C (height only)": (None, 800),
+    "none": (None, None),
+}
+MAX_SIZES_MB = [None, 0.5]
+FAST_RESIZE = [True, None]
+
+# ==============================================================================
+#                  END CONFIGURATION - SCRIPT LOGIC BELOW
+# ==============================================================================
+
+SIZES = [(640, 480), (1920, 1080), (3000, 2000), (4032, 3024), (6000, 4000)]
+KINDS = [("RGB", ".jpg"), ("RGB", ".png"), ("RGBA", ".png"), ("P", ".png"), ("RGB", ".webp")]
+
+
+def make_image(rng, size, mode):
+    """A photo-ish test image: gradient background, shapes and a patch of noise."""
+    width, height = size
+    img = Image.linear_gradient("L").resize(size).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.randint(5, 25)):
+        x, y = rng.randrange(width), rng.randrange(height)
+        w, h = rng.randint(width // 20, width // 3), rng.randint(height // 20, height // 3)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.ellipse((x, y, x + w, y + h), fill=color)
+        else:
+            draw.rectangle((x, y, x + w, y + h), fill=color)
+
+    # Noise is what makes real photos hard to compress
+    noise = Image.effect_noise((width // 3, height // 3), rng.randint(10, 60)).convert("RGB")
+    img.paste(noise, (rng.randrange(width - noise.width), rng.randrange(height - noise.height)))
+
+    if mode == "RGBA":
+        img.putalpha(Image.linear_gradient("L").rotate(90).resize(size))
+    elif mode == "P":
+        img = img.quantize(colors=rng.choice([16, 64, 256]))
+    return img
+
+
+def make_corpus():
+    """Create the synthetic corpus, unless the same one (seed + size) is already there."""
+    info_path = os.path.join(CORPUS_FOLDER, "corpus.json")
+    info = {"seed": SEED, "size": CORPUS_SIZE}
+    try:
+        with open(info_path) as f:
+            if json.load(f) == info:
+                print(f"Using existing corpus in {CORPUS_FOLDER}")
+                return
+    except (OSError, ValueError):
+        pass
+
+    print(f"Creating {CORPUS_SIZE} test images in {CORPUS_FOLDER} ...")
+    os.makedirs(CORPUS_FOLDER, exist_ok=True)
+    rng = random.Random(SEED)
+    for i in range(CORPUS_SIZE):
+        size = rng.choice(SIZES)
+        mode, ext = rng.choice(KINDS)
+        img = make_image(rng, size, mode)
+        if ext == ".jpg":
+            img.save(os.path.join(CORPUS_FOLDER, f"img_{i:04d}{ext}"), quality=rng.randint(70, 98))
+        else:
+            img.save(os.path.join(CORPUS_FOLDER, f"img_{i:04d}{ext}"))
+
+    with open(info_path, "w") as f:
+        json.dump(info, f)
+
+
+def run_config(config):
+    """Run the toolkit over the corpus with one config (in its own process)."""
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+
+    width, height = RESIZES[config["resize"]]
+    job = toolkit.ImageJob(
+        target_format=config["format"],
+        target_width=width,
+        target_height=height,
+        max_size_mb=config["max_size_mb"],
+        fast_resize=config["fast_resize"],
+        input_folder=CORPUS_FOLDER,
+        output_folder=OUTPUT_FOLDER,
+    )
+
+    files = sorted(name for name, _, _ in toolkit.iter_images(job))
+    bytes_in = bytes_out = errors = 0
+    reports = []
+
+    start = time.perf_counter()
+    for filename in files:
+        ok, line, report = toolkit.process_file(filename, job, timed=True)
+        reports.append(report)
+        bytes_in += os.path.getsize(os.path.join(CORPUS_FOLDER, filename))
+        if ok:
+            bytes_out += report["bytes_out"]
+        else:
+            errors += 1
+            print(line)
+    seconds = time.perf_counter() - start
+    attempts = [report["encodes"] for report in reports if report["ok"]]
+
+    return {
+        "config": config,
+        "files": len(files),
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "images_per_sec": round(len(files) / seconds, 2) if seconds else None,
+        "encode_attempts_per_file": round(sum(attempts) / len(attempts), 2) if attempts else None,
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "peak_rss_mb": round(toolkit.peak_memory_mb() or 0, 1) or None,
+        "stages": toolkit.stage_summary(reports),
+    }
+
+
+def run_benchmark():
+    # Everything heavy runs in fresh child processes. Linux carries peak memory
+    # over from the parent, so the parent must stay small for the numbers to mean anything.
+    spawn = multiprocessing.get_context("spawn")
+    with spawn.Pool(1) as pool:
+        pool.apply(make_corpus)
+
+    configs = [
+        {"format": fmt, "resize": resize, "max_size_mb": max_mb, "fast_resize": fast}
+        for fmt, resize, max_mb, fast in itertools.product(
+            FORMATS, RESIZES, MAX_SIZES_MB, FAST_RESIZE
+        )
+        # Fast resize only matters when something gets resized
+        if not (fast and resize == "none")
+    ]
+
+    print(f"--- RUNNING {len(configs)} CONFIGURATIONS ---\n")
+    results = []
+    for config in configs:
+        with spawn.Pool(1) as pool:
+            result = pool.apply(run_config, (config,))
+        results.append(result)
+        print(
+            f"{str(config['format']):5} | resize {config['resize']:17} | "
+            f"max {str(config['max_size_mb']):4} MB | fast {'on ' if config['fast_resize'] else 'off'} | "
+            f"{result['images_per_sec']} img/s, {result['encode_attempts_per_file']} encodes/file, "
+            f"{result['bytes_out'] / 1024 / 1024:.1f} MB out, peak {result['peak_rss_mb']} MB"
+        )
+
+    report = {
+        "python": sys.version.split()[0],
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "corpus": {"folder": CORPUS_FOLDER, "seed": SEED, "size": CORPUS_SIZE},
+        "results": results,
+    }
+    with open(RESULTS_FILE, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to: {RESULTS_FILE}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
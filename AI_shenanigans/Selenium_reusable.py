@@ -1,69 +1,643 @@
 import os
+import json
 import time
+import queue
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.message import Message
+from urllib.parse import urlsplit, unquote
+import urllib3
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+try:
+    # File system events (inotify on Linux); without it the folder is polled
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
 
 # --- CHANGE THESE THREE ---
 TARGET_URL = ""
 SAVE_PATH = ""
 LINK_TEXT = ""
 
-# 1. Setup Folder
-download_dir = os.path.abspath(SAVE_PATH)
-if not os.path.exists(download_dir):
-    os.makedirs(download_dir)
+# --- DOWNLOAD SETTINGS ---
+# "http": Chrome only opens the page and collects the links + cookies, then the
+#         files are fetched with plain HTTP requests (much faster, can resume).
+# "browser": Chrome opens every link itself (for sites that need real clicks).
+DOWNLOAD_MODE = "http"
+MAX_CONCURRENT = 4  # How many downloads can run at the same time
+START_TIMEOUT = 15  # Give up on links that haven't started downloading after this many seconds
 
-# 2. Setup Options
-chrome_options = Options()
-chrome_options.add_argument("--headless=new")
-chrome_options.add_experimental_option('prefs', {
-    "download.default_directory": download_dir,
-    "download.prompt_for_download": False,
-    "plugins.always_open_pdf_externally": True 
-})
+# --- WAITS & TIMING ---
+PAGE_TIMEOUT = 30  # Max seconds to wait for the page and the links to show up
+NETWORK_IDLE = 0.5  # Page is done once it goes this many seconds without new requests (None = don't wait)
+NETWORK_IDLE_OPEN = 2  # Requests that may stay open while "idle" (chat widgets, long polling...)
+TIMING_LOG = "scrape_timings.jsonl"  # One line of phase timings per job (None = don't save)
 
-driver = webdriver.Chrome(options=chrome_options)
+# --- DRIVER POOL (when running many jobs from one program) ---
+POOL_SIZE = 2  # Chrome instances kept running between jobs
+MAX_JOBS_PER_DRIVER = 50  # Restart a Chrome after this many jobs to keep memory in check
 
-# 3. THE KEY: Enable headless downloads via DevTools
-driver.execute_cdp_cmd('Page.setDownloadBehavior', {
-    'behavior': 'allow', 
-    'downloadPath': download_dir
-})
 
-try:
-    print(f"Opening: {TARGET_URL}")
-    driver.get(TARGET_URL)
-    time.sleep(3)
+def setup_driver():
+    # 2. Setup Options
+    chrome_options = Options()
+    chrome_options.add_argument("--headless=new")
+    chrome_options.add_experimental_option('prefs', {
+        "download.prompt_for_download": False,
+        "plugins.always_open_pdf_externally": True,
+        # Don't ask "This site is trying to download multiple files"
+        "profile.default_content_setting_values.automatic_downloads": 1,
+    })
+    # DevTools events in the performance log: Network.* lets wait_for_page follow
+    # every request, Page.downloadWillBegin tells run_downloads which tab a download came from
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    chrome_options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True})
+
+    return webdriver.Chrome(options=chrome_options)
+
+
+def set_download_dir(driver, download_dir):
+    # 3. THE KEY: Enable headless downloads via DevTools.
+    # Browser-wide, so it covers the extra tabs too, and it can change between jobs.
+    driver.execute_cdp_cmd('Browser.setDownloadBehavior', {
+        'behavior': 'allow',
+        'downloadPath': download_dir
+    })
+
+
+class DriverPool:
+    """A few headless Chromes that stay running and are shared by many jobs.
+
+    Starting Chrome takes seconds, so jobs borrow an already running one with
+    `with pool.driver() as driver:`. Drivers are checked before they're handed
+    out (a dead one is replaced), cleaned up after each job, and restarted
+    after MAX_JOBS_PER_DRIVER jobs.
+    """
+
+    def __init__(self, size=POOL_SIZE, max_jobs=MAX_JOBS_PER_DRIVER):
+        self.max_jobs = max_jobs
+        self.idle = queue.Queue()
+        self.jobs_done = {}  # driver -> jobs it has run
+        self.lock = threading.Lock()
+
+        # Start them all at once instead of one after another
+        with ThreadPoolExecutor(max_workers=size) as starter:
+            for driver in starter.map(lambda _: setup_driver(), range(size)):
+                self.add(driver)
+
+    def add(self, driver):
+        with self.lock:
+            self.jobs_done[driver] = 0
+        self.idle.put(driver)
+
+    def replace(self, driver):
+        with self.lock:
+            self.jobs_done.pop(driver, None)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+        new_driver = setup_driver()
+        with self.lock:
+            self.jobs_done[new_driver] = 0
+        return new_driver
+
+    def is_healthy(self, driver):
+        try:
+            return driver.execute_script("return 1;") == 1
+        except Exception:  # A quit driver fails with connection errors, not WebDriverException
+            return False
+
+    def reset(self, driver):
+        """Leave a driver the way a new job expects it: one blank tab, no cookies or site data."""
+        main_window = driver.window_handles[0]
+        for handle in driver.window_handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(main_window)
+
+        # delete_all_cookies() only covers the current page's site, so go through
+        # DevTools: every cookie, plus local storage, IndexedDB etc. of the last page
+        url = urlsplit(driver.current_url)
+        if url.scheme in ("http", "https"):
+            driver.execute_cdp_cmd("Storage.clearDataForOrigin", {
+                "origin": f"{url.scheme}://{url.netloc}",
+                "storageTypes": "all",
+            })
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.get("about:blank")
+        driver.get_log("performance")  # Drop the events nobody read (see download_tabs)
+
+    @contextmanager
+    def driver(self):
+        driver = self.idle.get()
+        try:
+            if not self.is_healthy(driver):
+                driver = self.replace(driver)
+        except Exception:
+            # Chrome wouldn't start; hand the dead driver back so the pool keeps
+            # its size, and the next job tries again
+            self.idle.put(driver)
+            raise
+        try:
+            yield driver
+        finally:
+            self.give_back(driver)
+
+    def give_back(self, driver):
+        """Clean up (or restart) a driver after a job and put it back in the pool."""
+        with self.lock:
+            self.jobs_done[driver] = self.jobs_done.get(driver, 0) + 1
+            worn_out = self.jobs_done[driver] >= self.max_jobs
+        try:
+            if not worn_out:
+                try:
+                    self.reset(driver)
+                except WebDriverException:
+                    worn_out = True
+            if worn_out:
+                driver = self.replace(driver)
+        except Exception as e:
+            # Same as above: the dead driver goes back and is replaced on its next job
+            print(f"Couldn't restart Chrome: {e}")
+        self.idle.put(driver)
+
+    def close(self):
+        with self.lock:
+            drivers = list(self.jobs_done)
+            self.jobs_done.clear()
+        for driver in drivers:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
+
+
+def wait_for_page(driver, link_text, timings):
+    """Wait for the page to really be ready instead of sleeping a fixed time.
+
+    Phases: document ready -> a matching link is present -> network idle
+    (at most NETWORK_IDLE_OPEN requests still open and nothing started or
+    finished for NETWORK_IDLE seconds). Each phase's duration is added to timings.
+    """
+    start = time.perf_counter()
+    wait = WebDriverWait(driver, PAGE_TIMEOUT, poll_frequency=0.1)
+
+    wait.until(lambda d: d.execute_script("return document.readyState;") == "complete")
+    start = add_time(timings, "dom_ready", start)
+
+    try:
+        wait.until(EC.presence_of_element_located((By.PARTIAL_LINK_TEXT, link_text)))
+    except TimeoutException:
+        print(f"No '{link_text}' link showed up within {PAGE_TIMEOUT}s.")
+    start = add_time(timings, "links_present", start)
+
+    if NETWORK_IDLE:
+        # Scripts may still be adding links; wait until requests stop coming in.
+        # The Network events in the performance log have every request since
+        # driver.get(), including ones that haven't finished yet.
+        open_requests = set()
+        last = {"changed": time.perf_counter()}
 
-    # 4. Find and Click
-    links = driver.find_elements(By.PARTIAL_LINK_TEXT, LINK_TEXT)
+        def network_idle(d):
+            now = time.perf_counter()
+            for entry in d.get_log("performance"):
+                message = json.loads(entry["message"])["message"]
+                if message["method"] == "Network.requestWillBeSent":
+                    open_requests.add(message["params"]["requestId"])
+                elif message["method"] in ("Network.loadingFinished", "Network.loadingFailed"):
+                    open_requests.discard(message["params"]["requestId"])
+                else:
+                    continue
+                last["changed"] = now
+            return len(open_requests) <= NETWORK_IDLE_OPEN and now - last["changed"] >= NETWORK_IDLE
+
+        try:
+            wait.until(network_idle)
+        except TimeoutException:
+            print(f"Page was still loading things after {PAGE_TIMEOUT}s, going ahead anyway.")
+        add_time(timings, "network_idle", start)
+
+
+def add_time(timings, phase, start):
+    """Store the seconds since start under phase; returns the current time."""
+    now = time.perf_counter()
+    timings[phase] = round(now - start, 3)
+    return now
+
+
+timing_lock = threading.Lock()
+
+
+def log_timings(target_url, timings):
+    print("Timing: " + " | ".join(f"{phase} {seconds}s" for phase, seconds in timings.items()))
+    if TIMING_LOG:
+        with timing_lock, open(TIMING_LOG, "a") as f:
+            f.write(json.dumps({"url": target_url, "time": time.time(), **timings}) + "\n")
+
+
+def find_links(driver, link_text):
+    # 4. Find the links (and read their hrefs right away, before anything navigates)
+    links = driver.find_elements(By.PARTIAL_LINK_TEXT, link_text)
     print(f"Found {len(links)} links.")
 
     # Finds the link that says "Final shooting script" ONLY inside the Big Fish section
     #links = driver.find_elements(By.XPATH, "//a[contains(@href, 'big-fish') and contains(text(), 'Final shooting script')]")
     #print(f"Found {len(links)} link(s).")
 
-    for link in links:
-        title = link.text.strip()
-        url = link.get_attribute('href')
-        print(f"Clicking {url}")
+    return [link.get_attribute('href') for link in links]
+
+
+def is_partial(name):
+    # Chrome writes "<name>.crdownload" (or a hidden temp file) until the download is done
+    return name.endswith((".crdownload", ".tmp")) or name.startswith(".")
+
+
+class EventForwarder(FileSystemEventHandler):
+    """Passes watchdog events on to a queue as ("created"/"moved"/"deleted", names...)."""
+
+    def __init__(self, events):
+        self.events = events
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.events.put(("created", os.path.basename(event.src_path)))
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.events.put((
+                "moved",
+                os.path.basename(event.src_path),
+                os.path.basename(event.dest_path),
+            ))
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.events.put(("deleted", os.path.basename(event.src_path)))
+
+
+class DownloadWatcher:
+    """Keeps track of downloads that show up in a folder after it was created.
+
+    Uses file system events (watchdog) when installed, so a finished download
+    is reported the moment Chrome renames its .crdownload file. Without
+    watchdog a background thread compares folder listings instead.
+    Files that were already in the folder are ignored, so it works on
+    non-empty folders too.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.existing = set(os.listdir(folder))
+        self.events = queue.Queue()
+        self.partial = {}  # partial file name -> time it showed up
+        self.finished = []  # {"name", "bytes", "seconds"} in the order they landed
+
+        if Observer is not None:
+            self.observer = Observer()
+            self.observer.schedule(EventForwarder(self.events), folder)
+            self.observer.start()
+        else:
+            self.observer = None
+            self.polling = True
+            threading.Thread(target=self.poll_folder, daemon=True).start()
+
+    @property
+    def in_progress(self):
+        return len(self.partial)
+
+    def started(self):
+        """How many downloads have shown up so far (finished or not)."""
+        return len(self.finished) + len(self.partial)
 
-        driver.execute_script("arguments[0].click();", link)
-        time.sleep(3) 
+    def poll_folder(self, interval=0.25):
+        # Fallback for when watchdog isn't installed: turn listing changes into events
+        seen = set(self.existing)
+        while self.polling:
+            now = set(os.listdir(self.folder))
+            for name in sorted(now - seen):
+                self.events.put(("created", name))
+            for name in sorted(seen - now):
+                self.events.put(("deleted", name))
+            seen = now
+            time.sleep(interval)
 
-    # 5. THE ROBUST WAIT
-    print("Waiting for downloads to start...")
-    for _ in range(15): # Wait up to 15 seconds for the first file to appear
-        if len(os.listdir(download_dir)) > 0:
+    def handle(self, event):
+        """Update the state for one event; returns the finished download or None."""
+        kind, name = event[0], event[-1]
+        if name in self.existing:
+            return None
+
+        if kind == "deleted":
+            self.partial.pop(name, None)  # cancelled (or renamed, when polling)
+            return None
+
+        if kind == "moved":
+            start = self.partial.pop(event[1], None)
+        else:
+            # When polling a rename looks like a new file; "x.pdf" was "x.pdf.crdownload"
+            start = self.partial.pop(name + ".crdownload", None)
+
+        if is_partial(name):
+            self.partial[name] = start or time.time()
+            return None
+        if any(item["name"] == name for item in self.finished):
+            return None
+
+        download = {
+            "name": name,
+            "bytes": os.path.getsize(os.path.join(self.folder, name)),
+            "seconds": round(time.time() - start, 2) if start else None,
+        }
+        self.finished.append(download)
+        return download
+
+    def wait(self, timeout):
+        """Block until at least one download finishes (or timeout); returns the new ones."""
+        deadline = time.time() + timeout
+        landed = []
+        while not landed:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                event = self.events.get(timeout=remaining)
+            except queue.Empty:
+                break
+            download = self.handle(event)
+            if download:
+                landed.append(download)
+
+        # Take any other events that are already waiting, without blocking
+        while True:
+            try:
+                download = self.handle(self.events.get_nowait())
+            except queue.Empty:
+                return landed
+            if download:
+                landed.append(download)
+
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+        else:
+            self.polling = False
+
+
+def download_all(driver, urls, download_dir):
+    """Open every url in its own tab, MAX_CONCURRENT at a time, and wait for all downloads.
+
+    A new tab is opened as soon as a running download finishes, and the
+    function returns as soon as the last file lands.
+    Returns one {"name", "bytes", "seconds"} dict per finished download.
+    """
+    watcher = DownloadWatcher(download_dir)
+    try:
+        return run_downloads(driver, urls, watcher)
+    finally:
+        watcher.stop()
+
+
+def download_tabs(driver):
+    """Ids of the tabs that began a download since the last call.
+
+    Read from Chrome's performance log (turned on in setup_driver), where
+    each event says which tab ("webview") it came from.
+    """
+    begun = set()
+    for entry in driver.get_log("performance"):
+        event = json.loads(entry["message"])
+        if event["message"]["method"] in ("Page.downloadWillBegin", "Browser.downloadWillBegin"):
+            begun.add(event.get("webview"))
+            begun.add(event["message"]["params"].get("frameId"))
+    return begun
+
+
+def run_downloads(driver, urls, watcher):
+    main_window = driver.current_window_handle
+    todo = list(urls)
+    waiting = {}  # tab handle -> (url, time to give up on it), for tabs that haven't started a download
+    download_tabs(driver)  # Throw away events from before this job
+
+    while todo or waiting or watcher.in_progress:
+        # Open more tabs while we're under the limit (tabs still waiting + downloads running)
+        while todo and len(waiting) + watcher.in_progress < MAX_CONCURRENT:
+            url = todo.pop(0)
+            print(f"Starting {url}")
+            known = set(driver.window_handles)
+            driver.execute_script("window.open(arguments[0], '_blank');", url)
+            for handle in driver.window_handles:
+                if handle not in known:
+                    waiting[handle] = (url, time.time() + START_TIMEOUT)
+
+        for download in watcher.wait(timeout=1):
+            print(f"Downloaded {download['name']} ({download['bytes'] / 1024 / 1024:.2f} MB"
+                  f" in {download['seconds']}s) [{len(watcher.finished)}/{len(urls)}]")
+
+        # Downloads keep going when their tab is closed, so a tab is closed once
+        # its own download has begun, or once it has had START_TIMEOUT seconds
+        begun = download_tabs(driver)
+        now = time.time()
+        for handle, (url, deadline) in list(waiting.items()):
+            if handle not in begun:
+                if now < deadline:
+                    continue
+                print(f"{url} didn't start a download within {START_TIMEOUT}s, giving up on it.")
+            del waiting[handle]
+            try:
+                driver.switch_to.window(handle)
+                driver.close()
+            except WebDriverException:
+                pass  # Chrome sometimes closes a tab that only held a download itself
+        driver.switch_to.window(main_window)
+
+    return watcher.finished
+
+
+def cookie_header(cookies, url):
+    """Cookie header with the browser cookies that belong to url's host."""
+    host = urlsplit(url).hostname or ""
+    pairs = [
+        f"{c['name']}={c['value']}"
+        for c in cookies
+        if host == c.get("domain", "").lstrip(".")
+        or host.endswith("." + c.get("domain", "").lstrip("."))
+    ]
+    return "; ".join(pairs)
+
+
+def claim_name(name, download_dir, taken, lock):
+    """name, or "name (1)", "name (2)"... if the file exists or another download in this run has it."""
+    stem, ext = os.path.splitext(name)
+    with lock:
+        n = 0
+        while name in taken or os.path.exists(os.path.join(download_dir, name)):
+            n += 1
+            name = f"{stem} ({n}){ext}"
+        taken.add(name)
+    return name
+
+
+def fetch_file(http, url, download_dir, headers, taken, lock, retries=3):
+    """Stream one url to download_dir, resuming a partial file if there is one.
+
+    The file is written as "<name>.<url hash>.part" and renamed when complete,
+    so an interrupted run picks up where it stopped next time.
+    Returns {"name", "bytes", "seconds"} like DownloadWatcher.
+    """
+    start = time.time()
+    name = os.path.basename(unquote(urlsplit(url).path)) or "download"
+    part_path = os.path.join(
+        download_dir, f"{name}.{hashlib.sha1(url.encode()).hexdigest()[:8]}.part"
+    )
+
+    for attempt in range(retries):
+        done = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        request_headers = dict(headers)
+        if done:
+            request_headers["Range"] = f"bytes={done}-"
+
+        response = http.request("GET", url, headers=request_headers, preload_content=False)
+        try:
+            if response.status == 416:  # Nothing left to fetch: the .part is complete
+                break
+            if response.status not in (200, 206):
+                raise RuntimeError(f"HTTP {response.status}")
+
+            # 206 = the server resumed for us, 200 = start over
+            with open(part_path, "ab" if response.status == 206 else "wb") as f:
+                for chunk in response.stream(1024 * 1024):
+                    f.write(chunk)
+
+            disposition = response.headers.get("Content-Disposition")
+            if disposition:
+                message = Message()
+                message["Content-Disposition"] = disposition
+                name = os.path.basename(message.get_filename() or name)
             break
-        time.sleep(1)
+        except (urllib3.exceptions.HTTPError, OSError):
+            if attempt == retries - 1:
+                raise
+        finally:
+            response.release_conn()
+
+    name = claim_name(name, download_dir, taken, lock)
+    final_path = os.path.join(download_dir, name)
+    os.replace(part_path, final_path)
+    return {
+        "name": name,
+        "bytes": os.path.getsize(final_path),
+        "seconds": round(time.time() - start, 2),
+    }
+
+
+def browser_identity(driver):
+    """The cookies and headers plain HTTP requests need to look like this browser."""
+    headers = {
+        "User-Agent": driver.execute_script("return navigator.userAgent;"),
+        "Referer": driver.current_url,
+    }
+    return driver.get_cookies(), headers
+
+
+def download_over_http(urls, download_dir, cookies, base_headers):
+    """Fetch every url with a pooled HTTP client, MAX_CONCURRENT at a time.
+
+    The browser's cookies and user agent (see browser_identity) are sent
+    along, so links behind a login still work.
+    Returns one {"name", "bytes", "seconds"} dict per file.
+    """
+    http = urllib3.PoolManager(
+        maxsize=MAX_CONCURRENT,
+        retries=urllib3.Retry(3, backoff_factor=0.5),
+        timeout=urllib3.Timeout(connect=START_TIMEOUT, read=60),
+    )
+
+    finished = []
+    taken, lock = set(), threading.Lock()  # file names used so far in this run
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT) as pool:
+        futures = {}
+        for url in urls:
+            headers = dict(base_headers, Cookie=cookie_header(cookies, url))
+            future = pool.submit(fetch_file, http, url, download_dir, headers, taken, lock)
+            futures[future] = url
+
+        for future in as_completed(futures):
+            try:
+                download = future.result()
+            except Exception as e:
+                print(f"Failed {futures[future]}: {e}")
+                continue
+            finished.append(download)
+            print(f"Downloaded {download['name']} ({download['bytes'] / 1024 / 1024:.2f} MB"
+                  f" in {download['seconds']}s) [{len(finished)}/{len(urls)}]")
+    return finished
+
+
+def run_job(pool, target_url=TARGET_URL, link_text=LINK_TEXT, save_path=SAVE_PATH):
+    """Download every link matching link_text on target_url into save_path.
+
+    Borrows a running Chrome from pool, so the only per-job cost is loading
+    the page. Every job downloads into a new folder of its own inside
+    save_path, so jobs running at the same time never see each other's files.
+    Returns (that folder, the finished downloads).
+    """
+    # 1. Setup Folder
+    os.makedirs(os.path.abspath(save_path), exist_ok=True)
+    download_dir = tempfile.mkdtemp(
+        prefix=time.strftime("job_%Y%m%d_%H%M%S_"), dir=os.path.abspath(save_path)
+    )
+
+    timings = {}
+    start = job_start = time.perf_counter()
+
+    with pool.driver() as driver:
+        start = add_time(timings, "get_driver", start)
+        set_download_dir(driver, download_dir)
+
+        print(f"Opening: {target_url}")
+        driver.get(target_url)
+        start = add_time(timings, "page_load", start)
+        wait_for_page(driver, link_text, timings)
+        start = time.perf_counter()
+
+        # 5. Download everything, a few at a time
+        urls = find_links(driver, link_text)
+        if DOWNLOAD_MODE == "http":
+            # Only the page needs the browser; hand it back before downloading
+            cookies, headers = browser_identity(driver)
+        else:
+            files = download_all(driver, urls, download_dir)
+
+    if DOWNLOAD_MODE == "http":
+        files = download_over_http(urls, download_dir, cookies, headers)
+    add_time(timings, "downloads", start)
+    add_time(timings, "total", job_start)
+    log_timings(target_url, timings)
+
+    print(f"Success! {len(files)} files saved to: {download_dir}")
+    return download_dir, files
+
+
+def main():
+    pool = DriverPool(size=1)
+    try:
+        run_job(pool)
+    finally:
+        pool.close()
 
-    print("Downloading... (Waiting for .crdownload files to vanish)")
-    while any(f.endswith(".crdownload") for f in os.listdir(download_dir)):
-        time.sleep(1)
-        
-finally:
-    driver.quit()
 
-print(f"Success! Files saved to: {download_dir}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
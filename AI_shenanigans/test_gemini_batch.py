@@ -0,0 +1,166 @@
+"""run_batch against a local stand-in for the streaming Gemini endpoint.
+
+The prompt text tells the mock server what to do: "slow ..." streams its
+words slowly, "429 ..." / "503 ..." fail the first try with that status,
+"400 ..." always fails.
+"""
+import asyncio
+import http.server
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import Gemini_test
+
+
+class MockGemini(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    running = 0
+    most_running = 0
+    starts = []  # (time, prompt) of every request, in the order they came in
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["contents"][0]["parts"][0]["text"]
+        cls = type(self)
+        with cls.lock:
+            tries = sum(p == prompt for _, p in cls.starts)
+            cls.starts.append((time.monotonic(), prompt))
+            cls.running += 1
+            cls.most_running = max(cls.most_running, cls.running)
+        try:
+            status = prompt.split()[0]
+            if status == "400" or (status in ("429", "503") and tries == 0):
+                self.send_error_json(int(status))
+            else:
+                self.send_stream(prompt.split(), 0.2 if status == "slow" else 0.02)
+        finally:
+            with cls.lock:
+                cls.running -= 1
+
+    def send_error_json(self, code):
+        body = json.dumps({"error": {"code": code, "message": "mock error", "status": "MOCK"}}).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, words, delay):
+        # Server-sent events, one word per event, in a chunked response
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, word in enumerate(words):
+            time.sleep(delay)
+            event = {"candidates": [{"content": {"parts": [{"text": word + " "}], "role": "model"}}]}
+            if i == len(words) - 1:
+                event["usageMetadata"] = {"candidatesTokenCount": len(words), "promptTokenCount": 1}
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def mock_server(monkeypatch):
+    MockGemini.running = MockGemini.most_running = 0
+    MockGemini.starts = []
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), MockGemini)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("GEMINI_BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    monkeypatch.setattr(Gemini_test, "CACHE_DIR", None)
+    monkeypatch.setattr(Gemini_test, "REQUESTS_PER_MINUTE", 60_000)  # tests that need it lower set it
+    yield MockGemini
+    server.shutdown()
+    server.server_close()
+
+
+def run(tmp_path, prompts):
+    prompts_file = tmp_path / "prompts.jsonl"
+    results_file = tmp_path / "results.jsonl"
+    prompts_file.write_text("".join(json.dumps({"prompt": p}) + "\n" for p in prompts))
+    asyncio.run(Gemini_test.run_batch(str(prompts_file), str(results_file)))
+    return [json.loads(line) for line in results_file.read_text().splitlines()]
+
+
+def test_results_are_written_as_they_finish(mock_server, tmp_path):
+    prompts = ["slow one two three", "quick a", "quick b", "quick c"]
+    results = run(tmp_path, prompts)
+
+    assert sorted(r["id"] for r in results) == [0, 1, 2, 3]
+    assert results[-1]["id"] == 0  # started first, finished last
+    for result in results:
+        assert result["text"] == prompts[result["id"]] + " "
+        assert result["stats"]["chunks"] == len(prompts[result["id"]].split())
+
+
+def test_concurrency_cap(mock_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(Gemini_test, "MAX_CONCURRENT", 3)
+    results = run(tmp_path, [f"slow request {i}" for i in range(10)])
+
+    assert all("error" not in r for r in results)
+    assert mock_server.most_running == 3
+
+
+def test_rate_limit(mock_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(Gemini_test, "REQUESTS_PER_MINUTE", 600)  # one every 0.1s
+    run(tmp_path, [f"quick {i}" for i in range(8)])
+
+    times = [t for t, _ in mock_server.starts]
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert len(times) == 8
+    assert min(gaps) > 0.08
+
+
+def test_retries_rate_limit_and_overload_errors(mock_server, tmp_path):
+    results = {r["id"]: r for r in run(tmp_path, ["429 then ok", "503 then ok", "400 never ok"])}
+
+    assert results[0]["text"] == "429 then ok "
+    assert results[1]["text"] == "503 then ok "
+    assert "error" in results[2]
+    tries = [p for _, p in mock_server.starts]
+    assert tries.count("429 then ok") == 2
+    assert tries.count("503 then ok") == 2
+    assert tries.count("400 never ok") == 1  # other errors aren't retried
+
+
+def test_cache_hits_skip_the_rate_limiter(mock_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(Gemini_test, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(Gemini_test, "cache_bytes", None)
+    monkeypatch.setattr(Gemini_test, "REQUESTS_PER_MINUTE", 120)  # one every 0.5s
+    prompts = [f"quick {i}" for i in range(6)]
+    first = run(tmp_path, prompts)
+
+    start = time.monotonic()
+    second = run(tmp_path, prompts)
+    seconds = time.monotonic() - start
+
+    assert len(mock_server.starts) == 6  # nothing was asked twice
+    assert seconds < 0.5
+    assert all(r["stats"]["cached"] for r in second)
+    assert sorted(r["text"] for r in second) == sorted(r["text"] for r in first)
+
+
+def test_cache_is_trimmed_to_its_size_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(Gemini_test, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(Gemini_test, "cache_bytes", None)
+    monkeypatch.setattr(Gemini_test, "CACHE_MAX_MB", 0.01)  # about 10 KB
+    chunk = Gemini_test.types.GenerateContentResponse.model_validate(
+        {"candidates": [{"content": {"parts": [{"text": "x" * 1000}], "role": "model"}}]}
+    )
+    for i in range(50):
+        Gemini_test.cache_save(f"key{i}", [chunk])
+
+    sizes = [e.stat().st_size for e in os.scandir(tmp_path)]
+    assert sum(sizes) <= 0.01 * 1024 * 1024
+    assert os.path.exists(tmp_path / "key49.json")  # the newest answers are kept
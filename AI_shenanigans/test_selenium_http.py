@@ -0,0 +1,141 @@
+"""fetch_file (the "http" download mode) against a local server that supports Range."""
+import hashlib
+import http.server
+import os
+import re
+import threading
+
+import pytest
+import urllib3
+
+import Selenium_reusable
+
+FILES = {
+    "/files/data.bin": bytes(range(256)) * 400,
+    "/mirror/data.bin": b"same name, other server",
+    "/download?id=7": b"%PDF- pretend report",
+}
+
+
+class RangeServer(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    ranges = []  # Range header of every request (None when there was none)
+    honour_range = True
+
+    def do_GET(self):
+        body = FILES.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        requested = self.headers.get("Range")
+        type(self).ranges.append(requested)
+        match = re.fullmatch(r"bytes=(\d+)-", requested or "")
+        if match and self.honour_range:
+            start = int(match.group(1))
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+            body = body[start:]
+        else:
+            self.send_response(200)
+
+        if self.path.startswith("/download"):
+            self.send_header("Content-Disposition", 'attachment; filename="report.pdf"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    RangeServer.ranges = []
+    RangeServer.honour_range = True
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeServer)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def fetch(url, folder, taken=None):
+    return Selenium_reusable.fetch_file(
+        urllib3.PoolManager(), url, str(folder), {}, set() if taken is None else taken, threading.Lock()
+    )
+
+
+def part_path(folder, url, name):
+    return os.path.join(folder, f"{name}.{hashlib.sha1(url.encode()).hexdigest()[:8]}.part")
+
+
+def test_full_download(server, tmp_path):
+    download = fetch(server + "/files/data.bin", tmp_path)
+
+    assert download["name"] == "data.bin"
+    assert (tmp_path / "data.bin").read_bytes() == FILES["/files/data.bin"]
+    assert RangeServer.ranges == [None]
+    assert os.listdir(tmp_path) == ["data.bin"]  # the .part file was renamed
+
+
+def test_resumes_a_partial_file(server, tmp_path):
+    url = server + "/files/data.bin"
+    body = FILES["/files/data.bin"]
+    with open(part_path(tmp_path, url, "data.bin"), "wb") as f:
+        f.write(body[:1000])
+
+    fetch(url, tmp_path)
+
+    assert RangeServer.ranges == ["bytes=1000-"]
+    assert (tmp_path / "data.bin").read_bytes() == body
+
+
+def test_server_without_range_support_starts_over(server, tmp_path):
+    RangeServer.honour_range = False
+    url = server + "/files/data.bin"
+    with open(part_path(tmp_path, url, "data.bin"), "wb") as f:
+        f.write(b"x" * 1000)
+
+    fetch(url, tmp_path)
+
+    assert (tmp_path / "data.bin").read_bytes() == FILES["/files/data.bin"]
+
+
+def test_complete_partial_file_gets_416(server, tmp_path):
+    url = server + "/files/data.bin"
+    body = FILES["/files/data.bin"]
+    with open(part_path(tmp_path, url, "data.bin"), "wb") as f:
+        f.write(body)
+
+    fetch(url, tmp_path)
+
+    assert RangeServer.ranges == [f"bytes={len(body)}-"]
+    assert (tmp_path / "data.bin").read_bytes() == body
+
+
+def test_content_disposition_names_the_file(server, tmp_path):
+    download = fetch(server + "/download?id=7", tmp_path)
+
+    assert download["name"] == "report.pdf"
+    assert (tmp_path / "report.pdf").read_bytes() == FILES["/download?id=7"]
+
+
+def test_existing_files_are_not_overwritten(server, tmp_path):
+    (tmp_path / "data.bin").write_bytes(b"from an earlier run")
+    taken = set()
+
+    first = fetch(server + "/files/data.bin", tmp_path, taken)
+    second = fetch(server + "/mirror/data.bin", tmp_path, taken)
+
+    assert (tmp_path / "data.bin").read_bytes() == b"from an earlier run"
+    assert first["name"] == "data (1).bin"
+    assert second["name"] == "data (2).bin"
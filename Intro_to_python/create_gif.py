@@ -1,9 +1,165 @@
-import imageio.v3 as iio
+import os
+import glob
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, GifImagePlugin
 
-filenames = ['nyan-cat1.png', 'nyan-cat2.png', 'nyan-cat3.png']
-images = []
+# Frames in order: a list of filenames, a glob pattern like 'frames/*.png'
+# (sorted by name), or any generator that yields filenames
+FRAMES = ['nyan-cat1.png', 'nyan-cat2.png', 'nyan-cat3.png']
+OUTPUT = 'nyan.gif'
+DURATION = 100  # Milliseconds per frame
+LOOP = 0  # 0 = loop forever
 
-for filename in filenames:
-    images.append(iio.imread(filename))
+# 'rolling': a new palette every PALETTE_EVERY frames (best colors, a color table per palette)
+# 'global': one palette for every frame, made from PALETTE_SAMPLES frames spread
+#           over the whole animation (often smaller, fine when the colors stay similar)
+PALETTE = 'rolling'
+PALETTE_EVERY = 1
+PALETTE_SAMPLES = 16
 
-iio.imwrite('nyan.gif', images, duration=100, loop=0)
+WORKERS = 1  # More than 1 prepares frames in that many processes (frame order is kept)
+
+# Frames are written to the file one at a time, so memory stays the same
+# whether the GIF has 3 frames or 3000.
+
+
+def frame_files(frames):
+    """Filenames in frame order."""
+    if isinstance(frames, str):
+        return iter(sorted(glob.glob(frames)))
+    return iter(frames)
+
+
+def load_frame(filename, size):
+    """Open a frame as RGB, resized to the GIF size if it's different."""
+    with Image.open(filename) as img:
+        frame = img.convert('RGB')
+    if frame.size != size:
+        frame = frame.resize(size)
+    return frame
+
+
+def sample_palette(filenames, size, samples=PALETTE_SAMPLES):
+    """A 1x1 palette image with 256 colors from frames spread evenly over filenames.
+
+    The frames are shrunk and stacked into one picture, which is quantized
+    in one go, so colors that only show up later in the animation get a
+    place in the palette too. Only the palette is kept: this image is sent
+    along with every frame to the workers.
+    """
+    picked = filenames[::max(1, len(filenames) // samples)][:samples]
+    thumbs = []
+    for filename in picked:
+        frame = load_frame(filename, size)
+        frame.thumbnail((256, 256))
+        thumbs.append(frame)
+
+    width = max(thumb.width for thumb in thumbs)
+    sheet = Image.new('RGB', (width, sum(thumb.height for thumb in thumbs)))
+    top = 0
+    for thumb in thumbs:
+        sheet.paste(thumb, (0, top))
+        top += thumb.height
+    palette = Image.new('P', (1, 1))
+    palette.putpalette(sheet.quantize(256).getpalette())
+    return palette
+
+
+def prepare_frames(task):
+    """Decode, palettize and encode a group of frames (runs in a worker when WORKERS > 1).
+
+    With a palette every frame is mapped onto it. Without one the group
+    gets a new palette made from its first frame, stored with each frame.
+    Returns the GIF bytes of each frame.
+    """
+    filenames, size, palette, duration = task
+    local_palette = palette is None
+    frames = []
+    for filename in filenames:
+        frame = load_frame(filename, size)
+        if palette is None:
+            frame = palette = frame.quantize(256)
+        else:
+            frame = frame.quantize(palette=palette)
+        frames.append(b''.join(GifImagePlugin.getdata(
+            frame, duration=duration, include_color_table=local_palette
+        )))
+    return frames
+
+
+def frame_tasks(filenames, size, palette, duration):
+    """Split the filenames into groups that share a palette."""
+    group_size = 1 if palette is not None else PALETTE_EVERY
+    group = []
+    for filename in filenames:
+        group.append(filename)
+        if len(group) == group_size:
+            yield group, size, palette, duration
+            group = []
+    if group:
+        yield group, size, palette, duration
+
+
+def prepared_frames(tasks, workers):
+    """Encoded frames in order, working on at most 2 * workers groups ahead."""
+    if workers <= 1:
+        for task in tasks:
+            yield from prepare_frames(task)
+        return
+
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(prepare_frames, task))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def write_gif(frames, output, duration=DURATION, loop=LOOP, palette_mode=PALETTE, workers=WORKERS):
+    """Write an animated GIF one frame at a time. Returns the number of frames."""
+    filenames = frame_files(frames)
+    if palette_mode == 'global':
+        # The palette is sampled from the whole animation, so the names are needed up front
+        all_names = list(filenames)
+        filenames = iter(all_names)
+    first = next(filenames, None)
+    if first is None:
+        raise ValueError('No frames to write')
+
+    with Image.open(first) as img:
+        size = img.size
+    if palette_mode == 'global':
+        palette = sample_palette(all_names, size)
+        first_frame = load_frame(first, size).quantize(palette=palette)
+    else:
+        palette = None
+        first_frame = load_frame(first, size).quantize(256)
+
+    # Header + global palette; with a rolling palette each frame brings its own
+    header, _ = GifImagePlugin.getheader(
+        first_frame.copy(), info={'loop': loop, 'duration': duration, 'optimize': False}
+    )
+
+    def all_files():
+        yield first
+        yield from filenames
+
+    count = 0
+    temp_path = output + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(b''.join(header))
+        tasks = frame_tasks(all_files(), size, palette, duration)
+        for frame in prepared_frames(tasks, workers):
+            f.write(frame)
+            count += 1
+        f.write(b';')  # GIF trailer
+    os.replace(temp_path, output)
+    return count
+
+
+if __name__ == '__main__':
+    count = write_gif(FRAMES, OUTPUT)
+    print(f'Saved {count} frames to {OUTPUT}')
@@ -1,3 +1,11 @@
+from array import array
+from itertools import accumulate
+
+try:
+    import numpy as np  # Optional, builds the sparse table about 20x faster
+except ImportError:
+    np = None
+
 stock_prices = [
     34.68,
     36.09,
@@ -40,6 +48,123 @@ def min_price(a, b):
     return mn
 
 
-print(max_price(1, 15))
-print(min_price(5, 10))
-print(price_at(3))
+class PriceSeries:
+    """Prices with fast range queries. Days are numbered from 1, like price_at().
+
+    max/min of any range of days is O(1) (a sparse table: the min/max of
+    every run of 1, 2, 4, 8 ... days), mean is O(1) (running totals).
+    Prices added with append() go into a segment tree first, and the sparse
+    table is rebuilt once it covers less than half the prices.
+    """
+
+    def __init__(self, prices=()):
+        self.prices = array('d', prices)
+        self.totals = array('d', accumulate(self.prices, initial=0.0))  # totals[i] = sum of the first i prices
+        self._build_tree(max(1, len(self.prices)))
+        self._build_table()
+
+    def __len__(self):
+        return len(self.prices)
+
+    def price_at(self, i):
+        return self.prices[i - 1]
+
+    def _build_table(self):
+        """Sparse table over all current prices: level k covers 2**k days."""
+        self.mins = [self.prices]
+        self.maxes = [self.prices]
+        size = 1
+        while size * 2 <= len(self.prices):
+            lo, hi = self.mins[-1], self.maxes[-1]
+            # Runs of 2*size days = two runs of size days side by side
+            if np is None:
+                self.mins.append(array('d', map(min, lo[:-size], lo[size:])))
+                self.maxes.append(array('d', map(max, hi[:-size], hi[size:])))
+            else:
+                lo, hi = np.frombuffer(lo), np.frombuffer(hi)  # Views, no copying
+                self.mins.append(array('d', np.minimum(lo[:-size], lo[size:]).tobytes()))
+                self.maxes.append(array('d', np.maximum(hi[:-size], hi[size:]).tobytes()))
+            size *= 2
+        self.table_len = len(self.prices)
+
+    def _build_tree(self, capacity):
+        """Segment tree with room for capacity prices (leaves live at capacity + i)."""
+        self.capacity = 1 << (capacity - 1).bit_length()
+        self.tree_min = array('d', [float('inf')]) * (2 * self.capacity)
+        self.tree_max = array('d', [float('-inf')]) * (2 * self.capacity)
+        self.tree_min[self.capacity:self.capacity + len(self.prices)] = self.prices
+        self.tree_max[self.capacity:self.capacity + len(self.prices)] = self.prices
+        # Fill in one level at a time: node i is the min/max of nodes 2i and 2i + 1
+        level = self.capacity // 2
+        while level:
+            children = slice(2 * level, 4 * level, 2), slice(2 * level + 1, 4 * level, 2)
+            self.tree_min[level:2 * level] = array('d', map(min, *(self.tree_min[c] for c in children)))
+            self.tree_max[level:2 * level] = array('d', map(max, *(self.tree_max[c] for c in children)))
+            level //= 2
+
+    def append(self, price):
+        """Add the next day's price (O(log n); the tree doubles in size when it's full)."""
+        self.prices.append(price)
+        self.totals.append(self.totals[-1] + price)
+        if len(self.prices) > self.capacity:
+            self._build_tree(len(self.prices))
+        else:
+            # A new price can only lower a min or raise a max, so walk up
+            # until a node already has something lower (higher)
+            leaf = self.capacity + len(self.prices) - 1
+            node = leaf
+            while node and self.tree_min[node] > price:
+                self.tree_min[node] = price
+                node //= 2
+            node = leaf
+            while node and self.tree_max[node] < price:
+                self.tree_max[node] = price
+                node //= 2
+        if len(self.prices) > 2 * self.table_len:
+            self._build_table()
+
+    def _tree_range(self, a, b):
+        """(min, max) of days a..b from the segment tree."""
+        lo, hi = float('inf'), float('-inf')
+        left, right = a - 1 + self.capacity, b + self.capacity  # Leaves [left, right)
+        while left < right:
+            if left & 1:
+                lo, hi = min(lo, self.tree_min[left]), max(hi, self.tree_max[left])
+                left += 1
+            if right & 1:
+                right -= 1
+                lo, hi = min(lo, self.tree_min[right]), max(hi, self.tree_max[right])
+            left //= 2
+            right //= 2
+        return lo, hi
+
+    def _check(self, a, b):
+        if not 1 <= a <= b <= len(self.prices):
+            raise IndexError(f'days {a}..{b} are outside 1..{len(self.prices)}')
+
+    def max_price(self, a, b):
+        self._check(a, b)
+        if b > self.table_len:
+            return self._tree_range(a, b)[1]
+        level = (b - a + 1).bit_length() - 1
+        run = self.maxes[level]
+        # Two runs of 2**level days that together cover a..b (they may overlap)
+        return max(run[a - 1], run[b - (1 << level)])
+
+    def min_price(self, a, b):
+        self._check(a, b)
+        if b > self.table_len:
+            return self._tree_range(a, b)[0]
+        level = (b - a + 1).bit_length() - 1
+        run = self.mins[level]
+        return min(run[a - 1], run[b - (1 << level)])
+
+    def mean_price(self, a, b):
+        self._check(a, b)
+        return (self.totals[b] - self.totals[a - 1]) / (b - a + 1)
+
+
+if __name__ == '__main__':
+    print(max_price(1, 15))
+    print(min_price(5, 10))
+    print(price_at(3))
@@ -0,0 +1,67 @@
+import time
+import random
+
+import stock_analysis
+
+PRICES = 200_000  # Length of the fake price history
+QUERIES = 100_000  # Range queries for PriceSeries
+LOOP_QUERIES = 200  # The loop functions are O(n) per query, so they get fewer
+APPENDS = 100_000
+SEED = 1234
+
+
+def random_walk(rng, n):
+    prices = [50.0]
+    for _ in range(n - 1):
+        prices.append(max(0.01, prices[-1] + rng.gauss(0, 0.5)))
+    return prices
+
+
+def timed(label, queries, func):
+    start = time.perf_counter()
+    results = [func(a, b) for a, b in queries]
+    seconds = time.perf_counter() - start
+    print(f'{label:28} {len(queries):>7} queries  {seconds / len(queries) * 1e6:>10.2f} µs/query')
+    return results, seconds / len(queries)
+
+
+def run_benchmark():
+    rng = random.Random(SEED)
+    prices = random_walk(rng, PRICES)
+    queries = []
+    for _ in range(QUERIES):
+        a = rng.randint(1, PRICES)
+        queries.append((a, rng.randint(a, PRICES)))
+
+    start = time.perf_counter()
+    series = stock_analysis.PriceSeries(prices)
+    print(f'\nPriceSeries of {PRICES} prices built in {time.perf_counter() - start:.2f}s\n')
+
+    # The loop functions read the module's stock_prices list
+    stock_analysis.stock_prices = prices
+    loop_queries = queries[:LOOP_QUERIES]
+
+    for name in ('max_price', 'min_price'):
+        loop_results, loop_time = timed(f'loop {name}', loop_queries, getattr(stock_analysis, name))
+        fast_results, fast_time = timed(f'PriceSeries.{name}', queries, getattr(series, name))
+        assert fast_results[:LOOP_QUERIES] == loop_results, f'{name} answers differ'
+        print(f'{"":28} {loop_time / fast_time:,.0f}x faster\n')
+
+    timed('PriceSeries.mean_price', queries, series.mean_price)
+
+    # Appends, then queries that reach into the appended part
+    start = time.perf_counter()
+    for price in random_walk(rng, APPENDS):
+        series.append(price)
+    seconds = time.perf_counter() - start
+    print(f'{"PriceSeries.append":28} {APPENDS:>7} appends  {seconds / APPENDS * 1e6:>10.2f} µs/append')
+    total = len(series)
+    tail_queries = []
+    for _ in range(QUERIES):
+        a = rng.randint(1, total)
+        tail_queries.append((a, rng.randint(max(a, total - APPENDS // 4), total)))
+    timed('max_price after appends', tail_queries, series.max_price)
+
+
+if __name__ == '__main__':
+    run_benchmark()
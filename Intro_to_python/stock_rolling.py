@@ -0,0 +1,175 @@
+import math
+import time
+from collections import deque
+from itertools import islice
+
+try:
+    import numpy as np  # Needed for the whole-array versions and memory-mapped files
+except ImportError:
+    np = None
+
+# Rolling results are "full windows only": result[i] covers prices[i : i + window],
+# so n prices give n - window + 1 results.
+
+CHUNK = 4_000_000  # Prices per chunk in rolling_in_chunks() (32 MB of float64)
+
+
+# --- Streaming versions (any iterable, pure Python, constant memory) ---
+
+def stream_rolling_min(prices, window):
+    """Yield the min of every window, using a monotonic deque (O(n) total)."""
+    return _stream_extreme(prices, window, lambda old, new: old >= new)
+
+
+def stream_rolling_max(prices, window):
+    return _stream_extreme(prices, window, lambda old, new: old <= new)
+
+
+def _stream_extreme(prices, window, beaten):
+    # The deque holds (day, price) of prices that could still be the answer,
+    # best first. A new price knocks out every older one it beats, since
+    # the older ones leave the window first anyway.
+    candidates = deque()
+    for day, price in enumerate(prices):
+        while candidates and beaten(candidates[-1][1], price):
+            candidates.pop()
+        candidates.append((day, price))
+        if candidates[0][0] <= day - window:
+            candidates.popleft()
+        if day >= window - 1:
+            yield candidates[0][1]
+
+
+def stream_moving_average(prices, window):
+    """Yield the mean of every window, from a running total."""
+    prices = iter(prices)
+    first = list(islice(prices, window))
+    if len(first) < window:
+        return
+    recent = deque(first)
+    total = sum(first)
+    yield total / window
+    for price in prices:
+        total += price - recent.popleft()
+        recent.append(price)
+        yield total / window
+
+
+# --- Whole-array versions (NumPy) ---
+
+def load_prices(path):
+    """Open a price file without reading it into memory.
+
+    .npy files keep their own dtype, anything else is read as raw float64.
+    """
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='r')
+    return np.memmap(path, dtype=np.float64, mode='r')
+
+
+def rolling_min(prices, window):
+    """Min of every window in one pass (van Herk / Gil-Werman, O(n) whatever the window)."""
+    if np is None:
+        return list(stream_rolling_min(prices, window))
+    return _block_extreme(np.asarray(prices, dtype=np.float64), window, np.minimum, np.inf)
+
+
+def rolling_max(prices, window):
+    if np is None:
+        return list(stream_rolling_max(prices, window))
+    return _block_extreme(np.asarray(prices, dtype=np.float64), window, np.maximum, -np.inf)
+
+
+def _block_extreme(prices, window, pick, pad):
+    # Cut the prices into blocks of `window` (a reshape, no copying beyond
+    # the padding). Any window is the end of one block plus the start of the
+    # next, so it's pick(suffix of block k, prefix of block k + 1).
+    count = len(prices) - window + 1
+    if count <= 0:
+        return np.empty(0)
+    blocks = -(-len(prices) // window)
+    padded = np.full(blocks * window, pad)
+    padded[:len(prices)] = prices
+    grid = padded.reshape(blocks, window)
+    prefix = pick.accumulate(grid, axis=1).ravel()
+    suffix = pick.accumulate(grid[:, ::-1], axis=1)[:, ::-1].ravel()
+    return pick(suffix[:count], prefix[window - 1:window - 1 + count])
+
+
+def moving_average(prices, window):
+    """Mean of every window from cumulative sums."""
+    if np is None:
+        return list(stream_moving_average(prices, window))
+    totals = np.concatenate(([0.0], np.cumsum(prices, dtype=np.float64)))
+    return (totals[window:] - totals[:-window]) / window
+
+
+def returns(prices, periods=1, log=False):
+    """Return over every `periods` days: prices[i + periods] / prices[i] - 1 (or the log of the ratio)."""
+    if np is None:
+        ratios = [b / a for a, b in zip(prices, prices[periods:])]
+        return [math.log(r) for r in ratios] if log else [r - 1 for r in ratios]
+    prices = np.asarray(prices, dtype=np.float64)
+    ratios = prices[periods:] / prices[:-periods]
+    return np.log(ratios) if log else ratios - 1
+
+
+def rolling_in_chunks(func, prices, window, out=None, chunk=CHUNK):
+    """Run a rolling function over an array bigger than memory, chunk by chunk.
+
+    prices is usually from load_prices(). Chunks overlap by window - 1 so no
+    window is lost at the edges. out can be a memory-mapped array too (e.g.
+    np.lib.format.open_memmap('out.npy', mode='w+', dtype=np.float64,
+    shape=(len(prices) - window + 1,))) so the results never sit in memory either.
+    """
+    count = len(prices) - window + 1
+    if out is None:
+        out = np.empty(max(count, 0))
+    for start in range(0, count, chunk):
+        part = func(prices[start:start + chunk + window - 1], window)
+        out[start:start + len(part)] = part
+    return out
+
+
+def window_loop(prices, window):
+    """The O(n * window) way, with the max_price/min_price loops, for comparison."""
+    import stock_analysis
+
+    stock_analysis.stock_prices = list(prices)
+    days = len(prices) - window + 1
+    return (
+        [stock_analysis.min_price(a, a + window - 1) for a in range(1, days + 1)],
+        [stock_analysis.max_price(a, a + window - 1) for a in range(1, days + 1)],
+    )
+
+
+if __name__ == '__main__':
+    import random
+
+    rng = random.Random(1234)
+    prices = [50.0]
+    for _ in range(200_000 - 1):
+        prices.append(max(0.01, prices[-1] + rng.gauss(0, 0.5)))
+    window = 250
+
+    start = time.perf_counter()
+    slow_min, slow_max = window_loop(prices[:20_000], window)
+    slow = time.perf_counter() - start
+    print(f'\nmin_price/max_price per window: {20_000 / slow:,.0f} prices/sec')
+
+    start = time.perf_counter()
+    fast_min, fast_max = list(stream_rolling_min(prices, window)), list(stream_rolling_max(prices, window))
+    fast = time.perf_counter() - start
+    print(f'monotonic deque:               {len(prices) / fast:,.0f} prices/sec')
+    assert fast_min[:len(slow_min)] == slow_min and fast_max[:len(slow_max)] == slow_max
+
+    if np is not None:
+        start = time.perf_counter()
+        lows, highs = rolling_min(prices, window), rolling_max(prices, window)
+        average = moving_average(prices, window)
+        daily = returns(prices)
+        vector = time.perf_counter() - start
+        print(f'numpy (min, max, mean, returns): {len(prices) / vector:,.0f} prices/sec')
+        assert lows.tolist() == fast_min and highs.tolist() == fast_max
+        print(f'\nLast {window}-day window: low {lows[-1]:.2f}, high {highs[-1]:.2f}, '
+              f'average {average[-1]:.2f}, last daily return {daily[-1]:+.2%}')
@@ -1,34 +1,161 @@
 import csv
-from encodings import utf_8
-import ast
+import gc
+import heapq
+import time
+from itertools import islice
+
+try:
+    import numpy as np  # Optional, parses each chunk's column in one go
+except ImportError:
+    np = None
 
 csv_file_path = 'Python 2 Intermediate\\Bestseller.csv'
-best_selling_book = None
-max_sales = 0
-
-with open(csv_file_path, 'r', encoding='utf_8') as csv_file:
-    csv_reader = csv.reader(csv_file)
-    csv_file.readline()  # reads first line in order to skip it in the for loop
-    for row in csv_reader:
-        current_sales = float(
-            row[4]
-        )  # column 4 is where the data is located, sets variable to sales number
-        if (
-            current_sales > max_sales
-        ):  # max is initialized at 0 so it compares first row sales number, then loops through to compare higher sales numbers
-            max_sales = current_sales  # sets max to current sales
-            best_selling_book = row  # sets current row to best selling
-            # loops through to end with the best selling variable set to the row with the highest number of sales
-    print(
-        best_selling_book
-    )  # exits the for loop and prints the row with the highest number of sales
-    list_string = str(best_selling_book)
-my_list = ast.literal_eval(list_string)
-print(my_list[0])
-data_to_write = [
-    ['Book', 'Author', 'Sales in Millions'],
-    [my_list[0], my_list[1], my_list[4]],
-]
-with open('Python 2 Intermediate\\bestseller_info.csv', 'w', newline='') as file:
-    csv_writer = csv.writer(file)
-    csv_writer.writerows(data_to_write)
+output_file_path = 'Python 2 Intermediate\\bestseller_info.csv'
+
+SORT_COLUMN = 4  # Column number or header name to rank by (column 4 is sales)
+TOP_K = 1  # How many of the best rows to keep
+GROUP_BY = None  # Column number or header name to total SORT_COLUMN by, e.g. 'Genre'
+groups_file_path = 'Python 2 Intermediate\\bestseller_groups.csv'
+CHUNK_ROWS = 10_000  # Rows read at a time; memory stays the same however big the file is
+
+
+def column_index(header, column):
+    """Turn a header name into a column number (numbers are left alone)."""
+    return column if isinstance(column, int) else header.index(column)
+
+
+def to_float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return float('nan')  # Blank or broken numbers are skipped
+
+
+def parse_column(texts):
+    """One column of a chunk as floats (NaN where it isn't a number)."""
+    if np is None:
+        return [to_float(text) for text in texts]
+    try:
+        return np.array(texts, dtype=float)
+    except ValueError:
+        pass
+    try:
+        return np.array([text or 'nan' for text in texts], dtype=float)  # Blank cells
+    except ValueError:
+        return np.array([to_float(text) for text in texts])
+
+
+def top_candidates(values, k, floor):
+    """Positions in a chunk that could make the top k (in file order)."""
+    if np is None:
+        return [i for i, value in enumerate(values) if value > floor]
+
+    candidates = np.flatnonzero(values > floor)  # NaN is never > anything
+    if len(candidates) > k:
+        # Keep the k biggest (plus anything tied with the k-th)
+        kth = np.partition(values[candidates], -k)[-k]
+        candidates = candidates[values[candidates] >= kth]
+    return candidates.tolist()
+
+
+def add_to_groups(groups, keys, values):
+    """Add a chunk's values to the running [total, count] of each group."""
+    if np is None:
+        for key, value in zip(keys, values):
+            if value == value:  # Not NaN
+                total = groups.setdefault(key, [0.0, 0])
+                total[0] += value
+                total[1] += 1
+        return
+
+    ok = ~np.isnan(values)
+    names, inverse = np.unique(np.array(keys)[ok], return_inverse=True)
+    sums = np.bincount(inverse, weights=values[ok], minlength=len(names))
+    counts = np.bincount(inverse, minlength=len(names))
+    for key, chunk_sum, count in zip(names.tolist(), sums.tolist(), counts.tolist()):
+        total = groups.setdefault(key, [0.0, 0])
+        total[0] += chunk_sum
+        total[1] += count
+
+
+def aggregate(path, sort_column=SORT_COLUMN, k=TOP_K, group_by=GROUP_BY, chunk_rows=CHUNK_ROWS):
+    """Read the CSV in chunks and return (header, top rows, group totals, rows read).
+
+    top rows are (value, row) pairs, biggest first; ties go to the row that
+    came first in the file. group totals are {key: [total, count]}.
+    """
+    if k < 1:
+        raise ValueError(f'k must be at least 1, got {k}')
+    top = []  # Min-heap of (value, -row number, row), the smallest of the top k at top[0]
+    groups = {}
+
+    # Every chunk is a pile of new lists, which keeps setting off Python's
+    # garbage collector (that alone halved the speed). CSV rows can't
+    # reference each other, so it's safe to switch it off while reading.
+    gc_was_on = gc.isenabled()
+    gc.disable()
+    try:
+        header, rows_read = read_chunks(path, sort_column, k, group_by, chunk_rows, top, groups)
+    finally:
+        if gc_was_on:
+            gc.enable()
+
+    best = [(value, row) for value, _, row in sorted(top, reverse=True)]
+    return header, best, groups, rows_read
+
+
+def read_chunks(path, sort_column, k, group_by, chunk_rows, top, groups):
+    """The reading loop of aggregate(); fills top and groups, returns (header, rows read)."""
+    rows_read = 0
+    with open(path, 'r', encoding='utf_8', newline='') as csv_file:
+        csv_reader = csv.reader(csv_file)
+        header = next(csv_reader)
+        value_col = column_index(header, sort_column)
+        group_col = None if group_by is None else column_index(header, group_by)
+        # Blank lines and rows too short to have every column we need count as
+        # missing values (NaN), like a blank cell
+        width = max(value_col, group_col or 0) + 1
+
+        for chunk in iter(lambda: list(islice(csv_reader, chunk_rows)), []):
+            values = parse_column([row[value_col] if len(row) >= width else '' for row in chunk])
+
+            floor = top[0][0] if len(top) == k else float('-inf')
+            for i in top_candidates(values, k, floor):
+                item = (float(values[i]), -(rows_read + i), chunk[i])
+                if len(top) < k:
+                    heapq.heappush(top, item)
+                elif item > top[0]:
+                    heapq.heapreplace(top, item)
+
+            if group_col is not None:
+                keys = [row[group_col] if len(row) >= width else '' for row in chunk]
+                add_to_groups(groups, keys, values)
+            rows_read += len(chunk)
+
+    return header, rows_read
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    header, best, groups, rows_read = aggregate(csv_file_path)
+    seconds = time.perf_counter() - start
+
+    for value, row in best:
+        print(row)
+    if best:
+        print(best[0][1][0])
+    print(f'{rows_read} rows in {seconds:.2f}s ({rows_read / seconds:,.0f} rows/sec)')
+
+    data_to_write = [['Book', 'Author', 'Sales in Millions']]
+    for value, row in best:
+        data_to_write.append([row[0], row[1], row[column_index(header, SORT_COLUMN)]])
+    with open(output_file_path, 'w', newline='') as file:
+        csv_writer = csv.writer(file)
+        csv_writer.writerows(data_to_write)
+
+    if GROUP_BY is not None:
+        with open(groups_file_path, 'w', newline='') as file:
+            csv_writer = csv.writer(file)
+            csv_writer.writerow([header[column_index(header, GROUP_BY)], 'Total', 'Rows'])
+            for key, (total, count) in sorted(groups.items(), key=lambda item: -item[1][0]):
+                csv_writer.writerow([key, total, count])